@@ -0,0 +1,47 @@
+"""Add trigram indexes for document entity matching
+
+Revision ID: 3f2a9c1d7b4e
+Revises: 8d7cd7c158ae
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7b4e'
+down_revision = '8d7cd7c158ae'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Trigram GIN indexes let `ILIKE '%name%'` lookups use an index scan
+    # instead of a sequential scan. PostgreSQL only (pg_trgm extension).
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_equipment_designation_trgm',
+        'equipment',
+        ['designation'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'designation': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_failure_modes_mode_name_trgm',
+        'failure_modes',
+        ['mode_name'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'mode_name': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_failure_modes_mode_name_trgm', table_name='failure_modes')
+    op.drop_index('ix_equipment_designation_trgm', table_name='equipment')
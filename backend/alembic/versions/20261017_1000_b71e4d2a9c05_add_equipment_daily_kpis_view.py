@@ -0,0 +1,58 @@
+"""Add daily per-equipment intervention rollup materialized view
+
+Revision ID: b71e4d2a9c05
+Revises: 3f2a9c1d7b4e
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'b71e4d2a9c05'
+down_revision = '3f2a9c1d7b4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Per equipment and day sums of the interventions table, so period
+    # aggregates read a few rows per day instead of every intervention.
+    # PostgreSQL only (materialized views); the unique index is required by
+    # REFRESH MATERIALIZED VIEW CONCURRENTLY.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute(
+        """
+        CREATE MATERIALIZED VIEW mv_equipment_daily_kpis AS
+        SELECT
+            equipment_id,
+            date_intervention AS day,
+            COUNT(*) AS intervention_count,
+            SUM(duree_arret) AS downtime_hours,
+            SUM(cout_total) AS total_cost,
+            SUM(cout_materiel) AS material_cost,
+            SUM(cout_main_oeuvre) AS labor_cost
+        FROM interventions
+        GROUP BY equipment_id, date_intervention
+        """
+    )
+    op.create_index(
+        'ix_mv_equipment_daily_kpis_equipment_day',
+        'mv_equipment_daily_kpis',
+        ['equipment_id', 'day'],
+        unique=True
+    )
+    op.create_index(
+        'ix_mv_equipment_daily_kpis_day',
+        'mv_equipment_daily_kpis',
+        ['day'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS mv_equipment_daily_kpis')
@@ -0,0 +1,49 @@
+"""Add trailing 365-day per-equipment KPI table
+
+Revision ID: c4e8f1a2b6d3
+Revises: b71e4d2a9c05
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8f1a2b6d3'
+down_revision = 'b71e4d2a9c05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # One row per equipment with its MTBF/MTTR/availability over the last
+    # 365 days, recomputed daily next to the daily rollup view (PostgreSQL
+    # only, like that view). The full KPIService results are kept as JSONB so
+    # default-range KPI queries read a single row.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.create_table(
+        'kpi_trailing_365d',
+        sa.Column('equipment_id', sa.Integer(), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        sa.Column('period_end', sa.Date(), nullable=False),
+        sa.Column('mtbf_hours', sa.Float(), nullable=True),
+        sa.Column('mttr_hours', sa.Float(), nullable=True),
+        sa.Column('availability_pct', sa.Float(), nullable=True),
+        sa.Column('failure_count', sa.Integer(), nullable=True),
+        sa.Column('mtbf', postgresql.JSONB(), nullable=False),
+        sa.Column('mttr', postgresql.JSONB(), nullable=False),
+        sa.Column('availability', postgresql.JSONB(), nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['equipment_id'], ['equipment.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('equipment_id')
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.drop_table('kpi_trailing_365d')
@@ -3,6 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from sqlalchemy import text
+import asyncio
 import logging
 
 from app.database import init_db, engine
@@ -24,6 +25,7 @@ from app.routers import (
     prediction # Added prediction router
 )
 from app.services.rag.rag_service import rag_service
+from app.services.kpi_service import KPI_MVIEW_REFRESH_INTERVAL, refresh_daily_rollup_periodically
 
 from app.security import get_current_user, get_current_user_optional
 
@@ -40,12 +42,18 @@ async def lifespan(app: FastAPI):
     """Application lifespan manager with ML initialization"""
     # Startup
     logger.info("Starting ProAct GMAO API...")
+    rollup_task = None
 
     try:
         # Initialize database
         init_db()
         logger.info("Relational database initialized successfully")
         
+        # Keep the daily KPI rollup view fresh (PostgreSQL only)
+        if KPI_MVIEW_REFRESH_INTERVAL > 0 and engine.dialect.name == "postgresql":
+            rollup_task = asyncio.create_task(refresh_daily_rollup_periodically())
+            logger.info(f"KPI rollup refresh every {KPI_MVIEW_REFRESH_INTERVAL}s")
+        
         # Initialize RAG system
         logger.info("Initializing RAG system...")
         rag_initialized = await rag_service.initialize()
@@ -61,6 +69,9 @@ async def lifespan(app: FastAPI):
         # Shutdown
         logger.info("Shutting down ProAct GMAO API...")
         
+        if rollup_task:
+            rollup_task.cancel()
+        
         # Shutdown RAG system
         await rag_service.shutdown()
         
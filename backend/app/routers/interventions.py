@@ -19,10 +19,19 @@ from app.schemas import (
     InterventionWithDetails, InterventionPartCreate, InterventionPartResponse,
     TechnicianAssignmentCreate, TechnicianAssignmentResponse
 )
+from app.services.kpi_service import KPIService
 
 router = APIRouter()
 
 
+def _invalidate_kpi_cache(db: Session, *equipment_ids: int) -> None:
+    """Drop cached and precomputed KPI results that include these equipment"""
+    from app.services.rag.kpi.kpi_executor import kpi_executor
+    for equipment_id in equipment_ids:
+        kpi_executor.invalidate(equipment_id)
+    KPIService.drop_trailing_kpis(db, list(set(equipment_ids)))
+
+
 @router.get("/", response_model=List[InterventionWithDetails])
 def list_interventions(
     skip: int = Query(0, ge=0),
@@ -162,6 +171,7 @@ def create_intervention(
     db.add(db_intervention)
     db.commit()
     db.refresh(db_intervention)
+    _invalidate_kpi_cache(db, db_intervention.equipment_id)
     
     return db_intervention
 
@@ -181,12 +191,14 @@ def update_intervention(
         raise HTTPException(status_code=404, detail="Intervention not found")
     
     # Update fields
+    previous_equipment_id = db_intervention.equipment_id
     update_data = intervention_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_intervention, field, value)
     
     db.commit()
     db.refresh(db_intervention)
+    _invalidate_kpi_cache(db, previous_equipment_id, db_intervention.equipment_id)
     
     return db_intervention
 
@@ -204,8 +216,10 @@ def delete_intervention(
     if not db_intervention:
         raise HTTPException(status_code=404, detail="Intervention not found")
     
+    equipment_id = db_intervention.equipment_id
     db.delete(db_intervention)
     db.commit()
+    _invalidate_kpi_cache(db, equipment_id)
     
     return None
 
@@ -227,6 +241,7 @@ def update_intervention_status(
     db_intervention.status = status
     db.commit()
     db.refresh(db_intervention)
+    _invalidate_kpi_cache(db, db_intervention.equipment_id)
     
     return db_intervention
 
@@ -314,6 +329,7 @@ def add_spare_part_to_intervention(
     
     db.commit()
     db.refresh(intervention_part)
+    _invalidate_kpi_cache(db, intervention.equipment_id)
     
     return {
         **intervention_part.__dict__,
@@ -348,6 +364,7 @@ def remove_spare_part_from_intervention(
     
     db.delete(intervention_part)
     db.commit()
+    _invalidate_kpi_cache(db, intervention.equipment_id)
     
     return None
 
@@ -446,6 +463,7 @@ def assign_technician_to_intervention(
     
     db.commit()
     db.refresh(assignment)
+    _invalidate_kpi_cache(db, intervention.equipment_id)
     
     return {
         **assignment.__dict__,
@@ -477,5 +495,6 @@ def remove_technician_from_intervention(
     
     db.delete(assignment)
     db.commit()
+    _invalidate_kpi_cache(db, intervention.equipment_id)
     
     return None
\ No newline at end of file
@@ -9,16 +9,57 @@ CORRECTED VERSION - Fixes:
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, case
-from datetime import date, datetime, timedelta
+from sqlalchemy import func, and_, case, column, table, text, Date, DateTime
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from datetime import date, datetime, timedelta, timezone
 from typing import Optional, Dict, List, Tuple
 from enum import Enum
+import asyncio
 import logging
+import os
 
+import orjson
+
+from app.database import SessionLocal
 from app.models import Equipment, Intervention, InterventionPart, TechnicianAssignment
 
 logger = logging.getLogger(__name__)
 
+# Seconds between refreshes of the daily rollup view (PostgreSQL only, see
+# the add_equipment_daily_kpis_view migration). 0 leaves the view unused and
+# every aggregate reads the interventions table directly.
+KPI_MVIEW_REFRESH_INTERVAL = int(os.getenv("KPI_MVIEW_REFRESH_INTERVAL", "0"))
+
+# Per equipment and day sums of interventions
+DAILY_KPIS_VIEW = table(
+    "mv_equipment_daily_kpis",
+    column("equipment_id"),
+    column("day"),
+    column("intervention_count"),
+    column("downtime_hours"),
+    column("total_cost"),
+    column("material_cost"),
+    column("labor_cost"),
+)
+
+# Per equipment MTBF/MTTR/availability over the trailing TRAILING_KPI_DAYS,
+# recomputed once a day by the rollup refresh task
+TRAILING_KPI_DAYS = 365
+TRAILING_KPIS_TABLE = table(
+    "kpi_trailing_365d",
+    column("equipment_id"),
+    column("period_start", Date),
+    column("period_end", Date),
+    column("mtbf_hours"),
+    column("mttr_hours"),
+    column("availability_pct"),
+    column("failure_count"),
+    column("mtbf", JSONB),
+    column("mttr", JSONB),
+    column("availability", JSONB),
+    column("refreshed_at", DateTime(timezone=True)),
+)
+
 
 class AvailabilityMethod(Enum):
     """Methods for calculating availability"""
@@ -63,6 +104,91 @@ class KPIService:
         
         return start_date, end_date
     
+    @staticmethod
+    def _use_daily_rollup(db: Session) -> bool:
+        """Whether period sums can be read from the daily rollup view"""
+        return KPI_MVIEW_REFRESH_INTERVAL > 0 and db.get_bind().dialect.name == "postgresql"
+    
+    @staticmethod
+    def refresh_daily_rollup(db: Session) -> None:
+        """Refresh the daily rollup view without blocking readers"""
+        db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_equipment_daily_kpis"))
+        db.commit()
+    
+    @staticmethod
+    def refresh_trailing_kpis(db: Session) -> int:
+        """
+        Recompute every equipment's trailing-year MTBF/MTTR/availability
+        (period ending today) and upsert them. Returns the row count.
+        """
+        end_date = date.today()
+        start_date = end_date - timedelta(days=TRAILING_KPI_DAYS)
+        refreshed_at = datetime.now(timezone.utc)
+        
+        rows = []
+        for (equipment_id,) in db.query(Equipment.id).all():
+            # JSON round-trip turns dates into the ISO strings stored in JSONB
+            mtbf, mttr, availability = (
+                orjson.loads(orjson.dumps(result)) for result in (
+                    KPIService.calculate_mtbf(db, equipment_id, start_date, end_date),
+                    KPIService.calculate_mttr(db, equipment_id, start_date, end_date),
+                    KPIService.calculate_availability(db, equipment_id, start_date, end_date),
+                )
+            )
+            rows.append({
+                "equipment_id": equipment_id,
+                "period_start": start_date,
+                "period_end": end_date,
+                "mtbf_hours": mtbf["mtbf_hours"],
+                "mttr_hours": mttr["mttr_hours"],
+                "availability_pct": availability["availability_percentage"],
+                "failure_count": mtbf["failure_count"],
+                "mtbf": mtbf,
+                "mttr": mttr,
+                "availability": availability,
+                "refreshed_at": refreshed_at,
+            })
+        
+        if rows:
+            stmt = pg_insert(TRAILING_KPIS_TABLE).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["equipment_id"],
+                set_={name: stmt.excluded[name] for name in rows[0] if name != "equipment_id"}
+            )
+            db.execute(stmt)
+        db.commit()
+        return len(rows)
+    
+    @staticmethod
+    def get_trailing_kpi(db: Session, equipment_id: int, kpi_type: str) -> Optional[Dict]:
+        """
+        Stored trailing-year result ("mtbf", "mttr" or "availability") for an
+        equipment, or None when the row is missing or was not computed today.
+        """
+        if not KPIService._use_daily_rollup(db):
+            return None
+        
+        row = db.execute(
+            TRAILING_KPIS_TABLE.select()
+            .with_only_columns(TRAILING_KPIS_TABLE.c.period_end, TRAILING_KPIS_TABLE.c[kpi_type])
+            .where(TRAILING_KPIS_TABLE.c.equipment_id == equipment_id)
+        ).first()
+        if row is None or row[0] != date.today():
+            return None
+        return row[1]
+    
+    @staticmethod
+    def drop_trailing_kpis(db: Session, equipment_ids: List[int]) -> None:
+        """Delete stored trailing KPIs of equipment whose interventions changed"""
+        if not equipment_ids or not KPIService._use_daily_rollup(db):
+            return
+        
+        db.execute(
+            TRAILING_KPIS_TABLE.delete()
+            .where(TRAILING_KPIS_TABLE.c.equipment_id.in_(equipment_ids))
+        )
+        db.commit()
+    
     @staticmethod
     def _get_corrective_interventions_query(
         db: Session,
@@ -593,19 +719,34 @@ class KPIService:
         try:
             start_date, end_date = KPIService._normalize_date_range(start_date, end_date)
             
-            query = db.query(
-                func.sum(Intervention.cout_total).label('total_cost'),
-                func.sum(Intervention.cout_materiel).label('material_cost'),
-                func.sum(Intervention.cout_main_oeuvre).label('labor_cost'),
-                func.count(Intervention.id).label('intervention_count')
-            )
+            # Plain sums: the daily rollup gives the same totals from a few
+            # rows per day (up to one refresh interval behind)
+            if KPIService._use_daily_rollup(db):
+                rollup = DAILY_KPIS_VIEW.c
+                query = db.query(
+                    func.sum(rollup.total_cost).label('total_cost'),
+                    func.sum(rollup.material_cost).label('material_cost'),
+                    func.sum(rollup.labor_cost).label('labor_cost'),
+                    func.sum(rollup.intervention_count).label('intervention_count')
+                )
+                equipment_column = rollup.equipment_id
+                date_column = rollup.day
+            else:
+                query = db.query(
+                    func.sum(Intervention.cout_total).label('total_cost'),
+                    func.sum(Intervention.cout_materiel).label('material_cost'),
+                    func.sum(Intervention.cout_main_oeuvre).label('labor_cost'),
+                    func.count(Intervention.id).label('intervention_count')
+                )
+                equipment_column = Intervention.equipment_id
+                date_column = Intervention.date_intervention
             
             if equipment_id:
-                query = query.filter(Intervention.equipment_id == equipment_id)
+                query = query.filter(equipment_column == equipment_id)
             if start_date:
-                query = query.filter(Intervention.date_intervention >= start_date)
+                query = query.filter(date_column >= start_date)
             if end_date:
-                query = query.filter(Intervention.date_intervention <= end_date)
+                query = query.filter(date_column <= end_date)
             
             result = query.first()
             
@@ -622,7 +763,7 @@ class KPIService:
                 "labor_cost": round(labor_cost, 2),
                 "material_percentage": round(material_pct, 2),
                 "labor_percentage": round(labor_pct, 2),
-                "intervention_count": result.intervention_count or 0
+                "intervention_count": int(result.intervention_count or 0)
             }
             
         except Exception as e:
@@ -713,4 +854,25 @@ class KPIService:
             
         except Exception as e:
             logger.error(f"Error getting dashboard KPIs: {e}")
-            raise
\ No newline at end of file
+            raise
+
+
+async def refresh_daily_rollup_periodically(interval: int = KPI_MVIEW_REFRESH_INTERVAL) -> None:
+    """
+    Background task: refresh the daily rollup view every `interval` seconds,
+    and the trailing-year KPI table on the first run of each day
+    """
+    trailing_refreshed_on: Optional[date] = None
+    while True:
+        await asyncio.sleep(interval)
+        db = SessionLocal()
+        try:
+            await asyncio.to_thread(KPIService.refresh_daily_rollup, db)
+            if trailing_refreshed_on != date.today():
+                count = await asyncio.to_thread(KPIService.refresh_trailing_kpis, db)
+                trailing_refreshed_on = date.today()
+                logger.info(f"Refreshed trailing KPIs of {count} equipment")
+        except Exception as e:
+            logger.error(f"Error refreshing daily KPI rollup: {e}")
+        finally:
+            db.close()
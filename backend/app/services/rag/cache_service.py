@@ -3,18 +3,22 @@ Redis Cache Service for RAG System
 Handles caching of embeddings and query results
 """
 
-import json
 import hashlib
 import logging
 from typing import Optional, List, Any, Dict
 import redis.asyncio as redis
 from redis.asyncio import ConnectionPool
 import numpy as np
+import orjson
 
 from app.services.rag.config import rag_settings
 
 logger = logging.getLogger(__name__)
 
+# Query results may carry numpy scalars (similarity scores) and non-str keys
+# (metadata/properties dicts), which orjson serializes natively.
+_RESULT_JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
 
 class CacheService:
     """Redis-based caching service for RAG system"""
@@ -71,10 +75,14 @@ class CacheService:
     def _query_key(self, query: str, params: Dict[str, Any]) -> str:
         """Generate cache key for query results"""
         query_hash = self._generate_hash(query)
-        params_str = json.dumps(params, sort_keys=True)
-        params_hash = self._generate_hash(params_str)
+        params_bytes = orjson.dumps(params, option=orjson.OPT_SORT_KEYS | _RESULT_JSON_OPTIONS)
+        params_hash = hashlib.sha256(params_bytes).hexdigest()
         return f"query:{query_hash}:{params_hash}"
     
+    def _sql_key(self, query: str) -> str:
+        """Generate cache key for LLM-generated SQL"""
+        return f"sql:{self._generate_hash(query)}"
+    
     async def get_embedding(self, text: str, model: str) -> Optional[np.ndarray]:
         """Retrieve cached embedding"""
         if not self._initialized or not rag_settings.ENABLE_CACHE:
@@ -133,7 +141,7 @@ class CacheService:
             cached = await self.redis_client.get(key)
             
             if cached:
-                result = json.loads(cached.decode())
+                result = orjson.loads(cached)
                 logger.debug(f"Cache hit for query: {query[:50]}...")
                 return result
             
@@ -155,7 +163,7 @@ class CacheService:
         
         try:
             key = self._query_key(query, params)
-            serialized = json.dumps(result).encode()
+            serialized = orjson.dumps(result, option=_RESULT_JSON_OPTIONS)
             
             ttl = ttl or rag_settings.REDIS_CACHE_TTL
             await self.redis_client.setex(key, ttl, serialized)
@@ -165,6 +173,41 @@ class CacheService:
             logger.warning(f"Error caching query result: {e}")
             return False
     
+    async def get_generated_sql(self, query: str) -> Optional[str]:
+        """Retrieve cached SQL generated for a (canonicalized) question"""
+        if not self._initialized or not rag_settings.ENABLE_CACHE:
+            return None
+        
+        try:
+            cached = await self.redis_client.get(self._sql_key(query))
+            if cached:
+                logger.debug(f"Cache hit for generated SQL: {query[:50]}...")
+                return cached.decode()
+            
+            return None
+        except Exception as e:
+            logger.warning(f"Error retrieving cached SQL: {e}")
+            return None
+    
+    async def set_generated_sql(
+        self,
+        query: str,
+        sql: str,
+        ttl: Optional[int] = None
+    ) -> bool:
+        """Cache SQL generated for a (canonicalized) question"""
+        if not self._initialized or not rag_settings.ENABLE_CACHE:
+            return False
+        
+        try:
+            # Bounded TTL so cached SQL does not outlive schema changes for long
+            ttl = ttl or rag_settings.SQL_CACHE_TTL
+            await self.redis_client.setex(self._sql_key(query), ttl, sql.encode())
+            return True
+        except Exception as e:
+            logger.warning(f"Error caching generated SQL: {e}")
+            return False
+    
     async def clear_embeddings(self, model: Optional[str] = None) -> int:
         """Clear cached embeddings"""
         if not self._initialized:
@@ -207,6 +250,26 @@ class CacheService:
             logger.error(f"Error clearing queries: {e}")
             return 0
     
+    async def clear_generated_sql(self) -> int:
+        """Clear cached generated SQL"""
+        if not self._initialized:
+            return 0
+        
+        try:
+            keys = []
+            async for key in self.redis_client.scan_iter(match="sql:*", count=100):
+                keys.append(key)
+            
+            if keys:
+                deleted = await self.redis_client.delete(*keys)
+                logger.info(f"Cleared {deleted} generated SQL cache entries")
+                return deleted
+            
+            return 0
+        except Exception as e:
+            logger.error(f"Error clearing generated SQL: {e}")
+            return 0
+    
     async def clear_all(self) -> int:
         """Clear all RAG-related cache"""
         if not self._initialized:
@@ -214,7 +277,8 @@ class CacheService:
         
         emb_count = await self.clear_embeddings()
         query_count = await self.clear_queries()
-        total = emb_count + query_count
+        sql_count = await self.clear_generated_sql()
+        total = emb_count + query_count + sql_count
         
         logger.info(f"Cleared total {total} cache entries")
         return total
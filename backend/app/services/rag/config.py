@@ -47,6 +47,8 @@ class RAGSettings(BaseSettings):
     ENABLE_HIERARCHICAL_RAG: bool = os.getenv("ENABLE_HIERARCHICAL_RAG", "true").lower() == "true"
     HIERARCHY_TOP_K_SECTIONS: int = int(os.getenv("HIERARCHY_TOP_K_SECTIONS", "3"))
     HIERARCHY_TOP_K_CHUNKS: int = int(os.getenv("HIERARCHY_TOP_K_CHUNKS", "5"))
+    # Flat, HNSW, SQ8, SQfp16
+    HIERARCHY_CHUNK_INDEX_TYPE: str = os.getenv("HIERARCHY_CHUNK_INDEX_TYPE", "HNSW")
     
     # ==================== Redis Configuration ====================
     
@@ -55,6 +57,7 @@ class RAGSettings(BaseSettings):
     REDIS_DB: int = int(os.getenv("REDIS_DB", "0"))
     REDIS_PASSWORD: Optional[str] = os.getenv("REDIS_PASSWORD", None)
     REDIS_CACHE_TTL: int = int(os.getenv("REDIS_CACHE_TTL", "3600"))  # 1 hour
+    SQL_CACHE_TTL: int = int(os.getenv("SQL_CACHE_TTL", "86400"))  # generated SQL, 1 day
     REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "10"))
     
     # ==================== FAISS Configuration ====================
@@ -64,6 +67,14 @@ class RAGSettings(BaseSettings):
     FAISS_DIMENSION: int = int(os.getenv("FAISS_DIMENSION", "768"))  # nomic-embed-text dimension
     FAISS_NLIST: int = int(os.getenv("FAISS_NLIST", "100"))  # For IVF
     FAISS_NPROBE: int = int(os.getenv("FAISS_NPROBE", "10"))  # For IVF
+    FAISS_HNSW_M: int = int(os.getenv("FAISS_HNSW_M", "32"))  # For HNSW
+    FAISS_HNSW_EF_CONSTRUCTION: int = int(
+        os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "200")
+    )  # For HNSW
+    FAISS_HNSW_EF_SEARCH: int = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))  # For HNSW
+    FAISS_USE_GPU: bool = os.getenv("FAISS_USE_GPU", "false").lower() == "true"  # Needs faiss-gpu
+    # mmap large index files on load
+    FAISS_MMAP_INDEX: bool = os.getenv("FAISS_MMAP_INDEX", "true").lower() == "true"
     
     # ==================== Document Processing ====================
     
@@ -95,6 +106,10 @@ class RAGSettings(BaseSettings):
     
     BATCH_SIZE: int = int(os.getenv("BATCH_SIZE", "32"))
     MAX_WORKERS: int = int(os.getenv("MAX_WORKERS", "4"))
+    KPI_CACHE_TTL: int = int(os.getenv("KPI_CACHE_TTL", "300"))  # seconds, 0 disables
+    KPI_CACHE_MAX_SIZE: int = int(os.getenv("KPI_CACHE_MAX_SIZE", "512"))
+    SQL_MAX_ROWS: int = int(os.getenv("SQL_MAX_ROWS", "1000"))  # generated SQL row cap
+    SQL_MAX_PLAN_COST: float = float(os.getenv("SQL_MAX_PLAN_COST", "1e7"))  # EXPLAIN total cost
     
     # ==================== Feature Flags ====================
     
@@ -5,7 +5,7 @@ Knowledge graph for relationship and causal reasoning
 
 # Lazy imports to avoid circular dependencies
 def __getattr__(name):
-    if name in ("NodeType", "EdgeType", "GraphNode", "GraphEdge"):
+    if name in ("LabeledEnum", "NodeType", "EdgeType", "GraphNode", "GraphEdge"):
         from app.services.rag.graph import schema
         return getattr(schema, name)
     elif name == "GMAOKnowledgeGraph":
@@ -20,6 +20,7 @@ def __getattr__(name):
     raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = [
+    "LabeledEnum",
     "NodeType",
     "EdgeType",
     "GraphNode",
@@ -4,9 +4,10 @@ Populates knowledge graph from database and documents
 """
 
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime
 
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 
 from app.services.rag.graph.schema import (
@@ -41,6 +42,11 @@ class GraphBuilder:
         """
         Populate graph from database tables.
         
+        Rows whose node is already in the graph are not rebuilt: their name
+        and properties keep the values from the earlier build, while their
+        edges are still added. Start from an empty graph to refresh node
+        attributes.
+        
         Returns:
             Dict with counts of nodes/edges added
         """
@@ -67,8 +73,12 @@ class GraphBuilder:
         # 1. Add Equipment nodes
         equipment_list = db.query(Equipment).all()
         for eq in equipment_list:
+            node_id = f"equipment:{eq.id}"
+            if node_id in self.graph:
+                continue
+            
             node = GraphNode(
-                id=f"equipment:{eq.id}",
+                id=node_id,
                 type=NodeType.EQUIPMENT,
                 name=eq.designation,
                 properties={
@@ -85,8 +95,12 @@ class GraphBuilder:
         # 2. Add SparePart nodes
         spare_parts = db.query(SparePart).all()
         for sp in spare_parts:
+            node_id = f"spare_part:{sp.id}"
+            if node_id in self.graph:
+                continue
+            
             node = GraphNode(
-                id=f"spare_part:{sp.id}",
+                id=node_id,
                 type=NodeType.SPARE_PART,
                 name=sp.designation,
                 properties={
@@ -103,8 +117,12 @@ class GraphBuilder:
         # 3. Add Technician nodes
         technicians = db.query(Technician).all()
         for tech in technicians:
+            node_id = f"technician:{tech.id}"
+            if node_id in self.graph:
+                continue
+            
             node = GraphNode(
-                id=f"technician:{tech.id}",
+                id=node_id,
                 type=NodeType.TECHNICIAN,
                 name=tech.name,
                 properties={
@@ -121,8 +139,12 @@ class GraphBuilder:
         try:
             skills = db.query(Skill).all()
             for skill in skills:
+                node_id = f"skill:{skill.id}"
+                if node_id in self.graph:
+                    continue
+                
                 node = GraphNode(
-                    id=f"skill:{skill.id}",
+                    id=node_id,
                     type=NodeType.SKILL,
                     name=skill.name,
                     properties={
@@ -139,20 +161,28 @@ class GraphBuilder:
         # 5. Add Intervention nodes and edges
         interventions = db.query(Intervention).all()
         for inv in interventions:
-            node = GraphNode(
-                id=f"intervention:{inv.id}",
-                type=NodeType.INTERVENTION,
-                name=f"Intervention #{inv.id}",
-                properties={
-                    "type_panne": inv.type_panne if hasattr(inv, 'type_panne') else None,
-                    "duree_arret": float(inv.duree_arret) if hasattr(inv, 'duree_arret') and inv.duree_arret else None,
-                    "date": str(inv.date_intervention) if hasattr(inv, 'date_intervention') else None
-                },
-                source_type="database",
-                source_id=str(inv.id)
-            )
-            if self.graph.add_node(node):
-                counts["interventions"] += 1
+            node_id = f"intervention:{inv.id}"
+            if node_id not in self.graph:
+                node = GraphNode(
+                    id=node_id,
+                    type=NodeType.INTERVENTION,
+                    name=f"Intervention #{inv.id}",
+                    properties={
+                        "type_panne": inv.type_panne if hasattr(inv, 'type_panne') else None,
+                        "duree_arret": (
+                            float(inv.duree_arret)
+                            if hasattr(inv, 'duree_arret') and inv.duree_arret else None
+                        ),
+                        "date": (
+                            str(inv.date_intervention)
+                            if hasattr(inv, 'date_intervention') else None
+                        )
+                    },
+                    source_type="database",
+                    source_id=str(inv.id)
+                )
+                if self.graph.add_node(node):
+                    counts["interventions"] += 1
             
             # Edge: Equipment -> fixed by -> Intervention
             if hasattr(inv, 'equipment_id') and inv.equipment_id:
@@ -169,22 +199,27 @@ class GraphBuilder:
         try:
             failure_modes = db.query(FailureMode).all()
             for fm in failure_modes:
-                node = GraphNode(
-                    id=f"failure_mode:{fm.id}",
-                    type=NodeType.FAILURE_MODE,
-                    name=fm.mode_description if hasattr(fm, 'mode_description') else f"FM-{fm.id}",
-                    properties={
-                        "severity": fm.severity if hasattr(fm, 'severity') else None,
-                        "occurrence": fm.occurrence if hasattr(fm, 'occurrence') else None,
-                        "detection": fm.detection if hasattr(fm, 'detection') else None,
-                        "rpn": fm.rpn if hasattr(fm, 'rpn') else None,
-                        "component": fm.component if hasattr(fm, 'component') else None
-                    },
-                    source_type="database",
-                    source_id=str(fm.id)
-                )
-                if self.graph.add_node(node):
-                    counts["failure_modes"] += 1
+                node_id = f"failure_mode:{fm.id}"
+                if node_id not in self.graph:
+                    node = GraphNode(
+                        id=node_id,
+                        type=NodeType.FAILURE_MODE,
+                        name=(
+                            fm.mode_description
+                            if hasattr(fm, 'mode_description') else f"FM-{fm.id}"
+                        ),
+                        properties={
+                            "severity": fm.severity if hasattr(fm, 'severity') else None,
+                            "occurrence": fm.occurrence if hasattr(fm, 'occurrence') else None,
+                            "detection": fm.detection if hasattr(fm, 'detection') else None,
+                            "rpn": fm.rpn if hasattr(fm, 'rpn') else None,
+                            "component": fm.component if hasattr(fm, 'component') else None
+                        },
+                        source_type="database",
+                        source_id=str(fm.id)
+                    )
+                    if self.graph.add_node(node):
+                        counts["failure_modes"] += 1
                 
                 # Edge: Equipment -> fails with -> FailureMode
                 if hasattr(fm, 'equipment_id') and fm.equipment_id:
@@ -246,8 +281,12 @@ class GraphBuilder:
                 RAGDocument.status == DocumentStatus.INDEXED
             ).all()
             for doc in documents:
+                node_id = f"document:{doc.id}"
+                if node_id in self.graph:
+                    continue
+                
                 node = GraphNode(
-                    id=f"document:{doc.id}",
+                    id=node_id,
                     type=NodeType.DOCUMENT,
                     name=doc.filename,
                     properties={
@@ -335,19 +374,19 @@ class GraphBuilder:
         edges_added = 0
         
         # Ensure document node exists
-        if doc_node_id not in self.graph.graph:
+        if doc_node_id not in self.graph:
             logger.warning(f"Document node {doc_node_id} not in graph")
             return 0
         
         # Link to mentioned equipment
-        for eq_name in extracted_metadata.get("equipment_mentions", []):
-            eq = db.query(Equipment).filter(
-                Equipment.designation.ilike(f"%{eq_name}%")
-            ).first()
+        equipment_mentions = extracted_metadata.get("equipment_mentions", [])
+        equipment_rows = self._match_mentions(db, Equipment.designation, equipment_mentions)
+        for eq_name in equipment_mentions:
+            eq_id = self._first_match(eq_name, equipment_rows)
             
-            if eq:
+            if eq_id is not None:
                 edge = GraphEdge(
-                    source_id=f"equipment:{eq.id}",
+                    source_id=f"equipment:{eq_id}",
                     target_id=doc_node_id,
                     type=EdgeType.DESCRIBED_IN,
                     confidence=0.8,
@@ -357,15 +396,15 @@ class GraphBuilder:
                     edges_added += 1
         
         # Link to mentioned failure modes
-        for fm_desc in extracted_metadata.get("failure_modes", []):
-            try:
-                fm = db.query(FailureMode).filter(
-                    FailureMode.mode_description.ilike(f"%{fm_desc}%")
-                ).first()
+        try:
+            failure_mentions = extracted_metadata.get("failure_modes", [])
+            failure_rows = self._match_mentions(db, FailureMode.mode_name, failure_mentions)
+            for fm_desc in failure_mentions:
+                fm_id = self._first_match(fm_desc, failure_rows)
                 
-                if fm:
+                if fm_id is not None:
                     edge = GraphEdge(
-                        source_id=f"failure_mode:{fm.id}",
+                        source_id=f"failure_mode:{fm_id}",
                         target_id=doc_node_id,
                         type=EdgeType.DESCRIBED_IN,
                         confidence=0.7,
@@ -373,14 +412,41 @@ class GraphBuilder:
                     )
                     if self.graph.add_edge(edge):
                         edges_added += 1
-            except Exception:
-                pass
+        except Exception:
+            pass
         
         if edges_added > 0:
             self.graph.save()
             logger.info(f"Added {edges_added} document relationships for doc {document_id}")
         
         return edges_added
+    
+    @staticmethod
+    def _match_mentions(db: Session, column, mentions: List[str]) -> List[Tuple[int, str]]:
+        """
+        Fetch (id, label) rows whose label contains any of the mentions.
+        
+        All mentions are resolved in a single round-trip; on PostgreSQL the
+        trigram GIN indexes keep each ILIKE branch off a sequential scan.
+        """
+        if not mentions:
+            return []
+        
+        model = column.class_
+        rows = db.query(model.id, column).filter(
+            or_(*(column.ilike(f"%{mention}%") for mention in mentions))
+        ).order_by(model.id).all()
+        
+        return [(row_id, label.lower()) for row_id, label in rows if label]
+    
+    @staticmethod
+    def _first_match(mention: str, rows: List[Tuple[int, str]]) -> Optional[int]:
+        """Return the id of the first row whose label contains the mention"""
+        mention_lower = mention.lower()
+        for row_id, label in rows:
+            if mention_lower in label:
+                return row_id
+        return None
 
 
 # Global builder instance
@@ -242,7 +242,7 @@ class GraphQueryService:
             context.add_causal_chain({
                 "from": node.name,
                 "cause": cause.name,
-                "cause_type": cause.type.value
+                "cause_type": cause.type.label
             })
         
         # Also get related failure modes if this is equipment
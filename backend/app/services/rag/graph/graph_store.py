@@ -1,15 +1,21 @@
 """
 GMAO Knowledge Graph Store
-NetworkX-based graph storage for relationship reasoning
+NetworkX-based graph storage for relationship reasoning, with a CSR
+adjacency snapshot for fast traversal
 """
 
+import gzip
 import logging
 import pickle
+import sys
+from dataclasses import replace
 from pathlib import Path
-from typing import List, Optional, Dict, Any, Set
-from collections import defaultdict
+from typing import List, Optional, Dict, Any, Set, Tuple, FrozenSet
+from collections import defaultdict, deque
 
 import networkx as nx
+import numpy as np
+import orjson
 
 from app.services.rag.config import rag_settings
 from app.services.rag.graph.schema import (
@@ -19,13 +25,124 @@ from app.services.rag.graph.schema import (
     GraphEdge
 )
 
+# Try to import numba for the compiled traversal kernel, gracefully handle if not installed
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Try to import zstandard for snapshot compression, falls back to gzip
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Dense integer code per edge type. Stored as `type_code` on every edge and
+# in the CSR edge-type columns, so filters are int/bit tests, not string compares
+_EDGE_TYPES: List[EdgeType] = list(EdgeType)
+_EDGE_TYPE_CODE: Dict[EdgeType, int] = {et: i for i, et in enumerate(_EDGE_TYPES)}
+_EDGE_TYPE_INDEX: Dict[str, int] = {et.label: i for i, et in enumerate(_EDGE_TYPES)}
+
+# Node attributes that are GraphNode fields rather than properties
+_NODE_RESERVED_ATTRS = frozenset({"type", "name", "source_type", "source_id"})
+
+# Shorter queries skip partial name matching in find_node_by_name
+_MIN_PARTIAL_MATCH_LENGTH = 3
+
+GRAPH_FILE = "gmao_graph.npz"
+LEGACY_GRAPH_FILE = "gmao_graph.pkl"  # pre-npz pickle format, still loadable
+_GRAPH_FORMAT_VERSION = 1
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _compress_meta(raw: bytes) -> bytes:
+    """Compress the JSON metadata blob (zstd if available, else gzip)"""
+    if ZSTD_AVAILABLE:
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    return gzip.compress(raw, compresslevel=1)
+
+
+def _decompress_meta(blob: bytes) -> bytes:
+    """Inverse of _compress_meta; the codec is detected from the magic bytes"""
+    if blob.startswith(_ZSTD_MAGIC):
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("Graph snapshot is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    if blob.startswith(_GZIP_MAGIC):
+        return gzip.decompress(blob)
+    return blob  # uncompressed (older snapshots)
+
+
+def _bfs_csr_kernel(
+    start, indptr_out, indices_out, etype_out, indptr_in, indices_in, etype_in,
+    allowed_mask, max_hops, follow_out, follow_in
+):
+    """
+    Hop-limited BFS over CSR arrays, returns reached node indices in BFS order.
+    
+    Uses an int32 ring-buffer queue and a uint8 visited array so the loop
+    compiles to plain machine code under numba.
+    """
+    n_nodes = indptr_out.shape[0] - 1
+    queue = np.empty(n_nodes, np.int32)
+    depth = np.empty(n_nodes, np.int32)
+    visited = np.zeros(n_nodes, np.uint8)
+    
+    queue[0] = start
+    depth[start] = 0
+    visited[start] = 1
+    head = 0
+    tail = 1
+    
+    while head < tail:
+        u = queue[head]
+        head += 1
+        d = depth[u]
+        if d >= max_hops:
+            continue
+        
+        if follow_out:
+            for j in range(indptr_out[u], indptr_out[u + 1]):
+                v = indices_out[j]
+                if allowed_mask[etype_out[j]] and visited[v] == 0:
+                    visited[v] = 1
+                    depth[v] = d + 1
+                    queue[tail] = v
+                    tail += 1
+        if follow_in:
+            for j in range(indptr_in[u], indptr_in[u + 1]):
+                v = indices_in[j]
+                if allowed_mask[etype_in[j]] and visited[v] == 0:
+                    visited[v] = 1
+                    depth[v] = d + 1
+                    queue[tail] = v
+                    tail += 1
+    
+    return queue[1:tail].copy()
+
+
+if NUMBA_AVAILABLE:
+    _bfs_csr_kernel = njit(cache=True)(_bfs_csr_kernel)
+
 
 class GMAOKnowledgeGraph:
     """
     Knowledge graph for GMAO domain using NetworkX.
     
+    NetworkX is the ingestion/persistence store. Traversals run on a CSR
+    snapshot (dense int32 node indices, int8 edge-type codes) rebuilt after
+    load/save; while the graph has unsaved mutations they fall back to
+    walking the NetworkX adjacency dicts.
+    
+    GraphNode objects returned by lookups and traversals come from a shared
+    node cache: treat them as read-only and use add_node() to change a node.
+    
     Used for relationship reasoning and context enrichment.
     NOT used for KPI calculations or numeric aggregation.
     """
@@ -34,15 +151,38 @@ class GMAOKnowledgeGraph:
         self.store_path = Path(store_path or rag_settings.GRAPH_STORE_PATH)
         self.graph = nx.DiGraph()
         self._node_by_name: Dict[str, str] = {}  # name -> node_id lookup
-        self._nodes_by_type: Dict[NodeType, Set[str]] = defaultdict(set)
+        self._nodes_by_type: Dict[NodeType, List[str]] = defaultdict(list)
+        # node_id -> materialized GraphNode, owned by the store and handed out read-only
+        self._node_cache: Dict[str, GraphNode] = {}
+        
+        # Per-edge-type adjacency: type -> node_id -> neighbor ids
+        self._succ_by_type: Dict[EdgeType, Dict[str, List[str]]] = self._empty_typed_adjacency()
+        self._pred_by_type: Dict[EdgeType, Dict[str, List[str]]] = self._empty_typed_adjacency()
         self._initialized = False
+        
+        # Trigram index over _node_by_name keys for partial name matching
+        self._trigram_index: Dict[str, Set[str]] = defaultdict(set)
+        self._indexed_names: Dict[str, Tuple[int, int]] = {}  # name -> (rank, n_grams)
+        self._short_names: Set[str] = set()  # names too short to have a trigram
+        
+        # CSR traversal snapshot (see _build_csr)
+        self._node_ids: List[str] = []
+        self._node_index: Dict[str, int] = {}
+        self._csr_out: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._csr_in: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._csr_valid = False
+        
+        # Cached weak connectivity for get_stats (None = recompute)
+        self._connectivity_cache: Optional[bool] = None
     
     def initialize(self) -> bool:
         """Initialize the knowledge graph"""
         try:
             self.store_path.mkdir(parents=True, exist_ok=True)
             
-            graph_file = self.store_path / "gmao_graph.pkl"
+            graph_file = self.store_path / GRAPH_FILE
+            if not graph_file.exists():
+                graph_file = self.store_path / LEGACY_GRAPH_FILE
             if graph_file.exists():
                 self.load(str(graph_file))
                 logger.info(
@@ -52,6 +192,9 @@ class GMAOKnowledgeGraph:
             else:
                 logger.info("Created new empty knowledge graph")
             
+            if not self._csr_valid:
+                self._build_csr()
+            
             self._initialized = True
             return True
             
@@ -59,21 +202,49 @@ class GMAOKnowledgeGraph:
             logger.error(f"Failed to initialize knowledge graph: {e}")
             return False
     
+    def contains_node(self, node_id: str) -> bool:
+        """Check whether a node ID is already in the graph (O(1))"""
+        return node_id in self.graph
+
+    def __contains__(self, node_id: str) -> bool:
+        return self.contains_node(node_id)
+
     def add_node(self, node: GraphNode) -> bool:
         """Add a node to the graph"""
         try:
+            is_new = node.id not in self.graph
+            previous_type = None if is_new else self.graph._node[node.id].get("type")
+            
             self.graph.add_node(
                 node.id,
-                type=node.type.value,
+                type=node.type.label,
                 name=node.name,
                 source_type=node.source_type,
                 source_id=node.source_id,
                 **node.properties
             )
             
+            if is_new:
+                self._csr_valid = False
+                # Own copy: later changes to the caller's node must not leak into the cache
+                self._node_cache[node.id] = replace(node, properties=dict(node.properties))
+                # A new node has no edges yet: connected only if it is the only node
+                self._connectivity_cache = self.graph.number_of_nodes() == 1
+            else:
+                # Attributes merge into the existing node; rebuild on next get
+                self._node_cache.pop(node.id, None)
+            
             # Update lookups
-            self._node_by_name[node.name.lower()] = node.id
-            self._nodes_by_type[node.type].add(node.id)
+            # Interned so the lookup, posting sets and rank table share one key object
+            name_lower = sys.intern(node.name.lower())
+            self._node_by_name[name_lower] = node.id
+            self._index_name(name_lower)
+            if is_new:
+                self._nodes_by_type[node.type].append(node.id)
+            elif previous_type != node.type.label:
+                # Re-typed node: move it to the new type bucket
+                self._nodes_by_type[NodeType.from_label(previous_type)].remove(node.id)
+                self._nodes_by_type[node.type].append(node.id)
             
             return True
         except Exception as e:
@@ -91,14 +262,31 @@ class GMAOKnowledgeGraph:
                 logger.warning(f"Target node {edge.target_id} not found")
                 return False
             
+            previous = self.graph._succ[edge.source_id].get(edge.target_id)
+            previous_code = previous["type_code"] if previous is not None else None
+            
             self.graph.add_edge(
                 edge.source_id,
                 edge.target_id,
-                type=edge.type.value,
+                type=edge.type.label,
+                type_code=_EDGE_TYPE_CODE[edge.type],
                 confidence=edge.confidence,
                 source=edge.source,
                 **edge.properties
             )
+            self._csr_valid = False
+            if self._connectivity_cache is False:
+                # Adding an edge can join components, never split them
+                self._connectivity_cache = None
+            
+            # Keep per-type buckets in sync (re-adding an edge may change its type)
+            if previous_code != _EDGE_TYPE_CODE[edge.type]:
+                if previous_code is not None:
+                    self._unindex_typed_edge(
+                        edge.source_id, edge.target_id, _EDGE_TYPES[previous_code]
+                    )
+                self._succ_by_type[edge.type][edge.source_id].append(edge.target_id)
+                self._pred_by_type[edge.type][edge.target_id].append(edge.source_id)
             
             return True
         except Exception as e:
@@ -106,27 +294,60 @@ class GMAOKnowledgeGraph:
             return False
     
     def get_node(self, node_id: str) -> Optional[GraphNode]:
-        """Get a node by ID"""
-        if node_id not in self.graph:
+        """Get a node by ID (shared with the node cache, treat it as read-only)"""
+        node = self._node_cache.get(node_id)
+        if node is not None:
+            return node
+        
+        data = self.graph._node.get(node_id)
+        if data is None:
             return None
         
-        data = self.graph.nodes[node_id]
-        return GraphNode(
+        return self._materialize_node(node_id, data)
+    
+    def _materialize_node(self, node_id: str, data: Dict[str, Any]) -> GraphNode:
+        """Build a GraphNode from its NetworkX attribute dict and cache it"""
+        node = GraphNode(
             id=node_id,
-            type=NodeType(data["type"]),
+            type=NodeType.from_label(data["type"]),
             name=data["name"],
-            properties={k: v for k, v in data.items() 
-                       if k not in ["type", "name", "source_type", "source_id"]},
+            properties={k: v for k, v in data.items() if k not in _NODE_RESERVED_ATTRS},
             source_type=data.get("source_type"),
             source_id=data.get("source_id")
         )
+        self._node_cache[node_id] = node
+        return node
+    
+    def _get_nodes(self, node_ids) -> List[GraphNode]:
+        """Materialize many known node IDs in one pass (unknown IDs are skipped)"""
+        cache = self._node_cache
+        nodes_data = self.graph._node
+        nodes = []
+        append = nodes.append
+        
+        for node_id in node_ids:
+            node = cache.get(node_id)
+            if node is None:
+                data = nodes_data.get(node_id)
+                if data is None:
+                    continue
+                node = self._materialize_node(node_id, data)
+            append(node)
+        
+        return nodes
     
     def find_node_by_name(
         self,
         name: str,
-        node_type: Optional[NodeType] = None
+        node_type: Optional[NodeType] = None,
+        fuzzy: bool = True
     ) -> Optional[GraphNode]:
-        """Find a node by name (case-insensitive)"""
+        """
+        Find a node by name (case-insensitive).
+        
+        With fuzzy=True, an exact miss falls back to substring matching for
+        queries of at least _MIN_PARTIAL_MATCH_LENGTH characters.
+        """
         name_lower = name.lower()
         
         node_id = self._node_by_name.get(name_lower)
@@ -135,15 +356,61 @@ class GMAOKnowledgeGraph:
             if node and (node_type is None or node.type == node_type):
                 return node
         
-        # Partial match fallback
-        for stored_name, node_id in self._node_by_name.items():
-            if name_lower in stored_name or stored_name in name_lower:
-                node = self.get_node(node_id)
-                if node and (node_type is None or node.type == node_type):
-                    return node
+        # Partial match fallback (tiny queries would match almost everything)
+        if not fuzzy or len(name_lower) < _MIN_PARTIAL_MATCH_LENGTH:
+            return None
+        
+        for stored_name in self._partial_name_matches(name_lower):
+            node = self.get_node(self._node_by_name[stored_name])
+            if node and (node_type is None or node.type == node_type):
+                return node
         
         return None
     
+    @staticmethod
+    def _trigrams(text: str) -> Set[str]:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+    
+    def _index_name(self, name_lower: str):
+        """Add a lowercased node name to the trigram index"""
+        if name_lower in self._indexed_names:
+            return
+        
+        grams = self._trigrams(name_lower)
+        self._indexed_names[name_lower] = (len(self._indexed_names), len(grams))
+        if not grams:
+            self._short_names.add(name_lower)
+        for gram in grams:
+            self._trigram_index[gram].add(name_lower)
+    
+    def _partial_name_matches(self, name_lower: str) -> List[str]:
+        """
+        Stored names that contain, or are contained in, the query.
+        
+        A name containing the query holds every query trigram, and a name
+        contained in the query has all of its own trigrams in the query, so
+        counting shared trigrams over the posting lists finds both without
+        scanning every stored name. Results keep insertion order.
+        Expects a query of at least _MIN_PARTIAL_MATCH_LENGTH characters.
+        """
+        query_grams = self._trigrams(name_lower)
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in query_grams:
+            for stored in self._trigram_index.get(gram, ()):
+                shared[stored] += 1
+        
+        n_query = len(query_grams)
+        indexed = self._indexed_names
+        matches = [
+            stored for stored, count in shared.items()
+            if (count == n_query and name_lower in stored)
+            or (count == indexed[stored][1] and stored in name_lower)
+        ]
+        matches.extend(stored for stored in self._short_names if stored in name_lower)
+        
+        matches.sort(key=lambda stored: indexed[stored][0])
+        return matches
+    
     def get_related_entities(
         self,
         node_id: str,
@@ -166,46 +433,220 @@ class GMAOKnowledgeGraph:
         if node_id not in self.graph:
             return []
         
-        edge_type_values = [e.value for e in edge_types] if edge_types else None
+        if max_hops == 1:
+            edge_type_codes = (
+                frozenset(_EDGE_TYPE_CODE[edge_type] for edge_type in edge_types)
+                if edge_types else None
+            )
+            related_ids = self._one_hop(node_id, edge_type_codes, direction)
+        elif self._csr_valid:
+            related_ids = self._traverse_csr(node_id, edge_types, max_hops, direction)
+        else:
+            related_ids = self._traverse_networkx(node_id, edge_types, max_hops, direction)
         
-        visited = set()
+        return self._get_nodes(related_ids)
+    
+    def _one_hop(
+        self,
+        node_id: str,
+        edge_type_codes: Optional[FrozenSet[int]],
+        direction: str
+    ) -> List[str]:
+        """Direct neighbors of a node, without any BFS bookkeeping"""
+        adjacency = []
+        if direction in ["out", "both"]:
+            adjacency.append(self.graph._succ[node_id])
+        if direction in ["in", "both"]:
+            adjacency.append(self.graph._pred[node_id])
+        
+        seen = {node_id}
         related = []
-        queue = [(node_id, 0)]
+        for neighbors in adjacency:
+            for neighbor_id, edge_data in neighbors.items():
+                if neighbor_id in seen:
+                    continue
+                if edge_type_codes is not None and edge_data["type_code"] not in edge_type_codes:
+                    continue
+                seen.add(neighbor_id)
+                related.append(neighbor_id)
         
-        while queue:
-            current_id, depth = queue.pop(0)
-            if current_id in visited or depth > max_hops:
-                continue
-            
-            visited.add(current_id)
-            
-            # Get neighbors based on direction
-            neighbors = []
+        return related
+    
+    def _traverse_csr(
+        self,
+        node_id: str,
+        edge_types: Optional[List[EdgeType]],
+        max_hops: int,
+        direction: str
+    ) -> List[str]:
+        """BFS over the CSR arrays, returns reached node IDs"""
+        if edge_types:
+            allowed = np.zeros(len(_EDGE_TYPES), dtype=np.uint8)
+            for edge_type in edge_types:
+                allowed[_EDGE_TYPE_CODE[edge_type]] = 1
+        else:
+            allowed = np.ones(len(_EDGE_TYPES), dtype=np.uint8)
+        
+        start = self._node_index[node_id]
+        follow_out = direction in ["out", "both"]
+        follow_in = direction in ["in", "both"]
+        
+        if NUMBA_AVAILABLE:
+            reached = _bfs_csr_kernel(
+                start, *self._csr_out, *self._csr_in,
+                allowed, max_hops, follow_out, follow_in
+            ).tolist()
+        else:
+            reached = self._traverse_csr_python(
+                start, allowed.view(bool), max_hops, follow_out, follow_in
+            )
+        
+        node_ids = self._node_ids
+        return [node_ids[i] for i in reached]
+    
+    def _traverse_csr_python(
+        self,
+        start: int,
+        allowed: np.ndarray,
+        max_hops: int,
+        follow_out: bool,
+        follow_in: bool
+    ) -> List[int]:
+        """Level-synchronous BFS with vectorized neighbor slices (no numba)"""
+        adjacency = []
+        if follow_out:
+            adjacency.append(self._csr_out)
+        if follow_in:
+            adjacency.append(self._csr_in)
+        
+        visited = np.zeros(len(self._node_ids), dtype=bool)
+        visited[start] = True
+        reached: List[int] = []
+        frontier = [start]
+        
+        for _ in range(max_hops):
+            next_frontier = []
+            for u in frontier:
+                for indptr, indices, etype in adjacency:
+                    lo, hi = indptr[u], indptr[u + 1]
+                    neighbors = indices[lo:hi][allowed[etype[lo:hi]]]
+                    for v in neighbors.tolist():
+                        if not visited[v]:
+                            visited[v] = True
+                            reached.append(v)
+                            next_frontier.append(v)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        
+        return reached
+    
+    def _traverse_networkx(
+        self,
+        node_id: str,
+        edge_types: Optional[List[EdgeType]],
+        max_hops: int,
+        direction: str
+    ) -> List[str]:
+        """BFS over the NetworkX dicts, used while the CSR snapshot is stale"""
+        visited = {node_id}
+        related = []
+        queue = deque([(node_id, 0)])
+        
+        visit = visited.add
+        emit = related.append
+        enqueue = queue.append
+        
+        # With a type filter, walk only the matching per-type buckets;
+        # otherwise walk the raw NetworkX adjacency dicts (succ[u] / pred[v])
+        adjacency = []
+        if edge_types:
+            for edge_type in edge_types:
+                if direction in ["out", "both"]:
+                    adjacency.append(self._succ_by_type[edge_type])
+                if direction in ["in", "both"]:
+                    adjacency.append(self._pred_by_type[edge_type])
+        else:
             if direction in ["out", "both"]:
-                neighbors.extend(self.graph.successors(current_id))
+                adjacency.append(self.graph._succ)
             if direction in ["in", "both"]:
-                neighbors.extend(self.graph.predecessors(current_id))
+                adjacency.append(self.graph._pred)
+        
+        while queue:
+            current_id, depth = queue.popleft()
+            if depth >= max_hops:
+                continue
             
-            for neighbor_id in neighbors:
-                if neighbor_id in visited:
-                    continue
-                
-                # Check edge type filter
-                if edge_type_values:
-                    edge_data = self.graph.edges.get((current_id, neighbor_id), {})
-                    if not edge_data:
-                        edge_data = self.graph.edges.get((neighbor_id, current_id), {})
-                    
-                    if edge_data.get("type") not in edge_type_values:
+            for adj in adjacency:
+                for neighbor_id in adj.get(current_id, ()):
+                    if neighbor_id in visited:
                         continue
-                
-                node = self.get_node(neighbor_id)
-                if node:
-                    related.append(node)
-                    queue.append((neighbor_id, depth + 1))
+                    
+                    visit(neighbor_id)
+                    emit(neighbor_id)
+                    enqueue((neighbor_id, depth + 1))
         
         return related
     
+    def _build_csr(self):
+        """
+        Snapshot the NetworkX adjacency into CSR arrays.
+        
+        Each node gets a dense int32 index; out- and in-edges are stored as
+        (indptr, indices, edge_type) triples so a hop is a contiguous slice.
+        """
+        node_ids = list(self.graph.nodes)
+        node_index = {nid: i for i, nid in enumerate(node_ids)}
+        n_edges = self.graph.number_of_edges()
+        
+        sources = np.empty(n_edges, dtype=np.int32)
+        targets = np.empty(n_edges, dtype=np.int32)
+        etypes = np.empty(n_edges, dtype=np.int8)
+        j = 0
+        for u, nbrs in self.graph._succ.items():
+            u_index = node_index[u]
+            for v, edge_data in nbrs.items():
+                sources[j] = u_index
+                targets[j] = node_index[v]
+                etypes[j] = edge_data["type_code"]
+                j += 1
+        
+        self._node_ids = node_ids
+        self._node_index = node_index
+        self._csr_out = self._to_csr(sources, targets, etypes, len(node_ids))
+        self._csr_in = self._to_csr(targets, sources, etypes, len(node_ids))
+        self._csr_valid = True
+    
+    @staticmethod
+    def _to_csr(
+        rows: np.ndarray,
+        cols: np.ndarray,
+        etypes: np.ndarray,
+        n_nodes: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        order = np.argsort(rows, kind="stable")
+        indptr = np.zeros(n_nodes + 1, dtype=np.int32)
+        np.cumsum(np.bincount(rows, minlength=n_nodes), out=indptr[1:])
+        return indptr, cols[order], etypes[order]
+    
+    @staticmethod
+    def _empty_typed_adjacency() -> Dict[EdgeType, Dict[str, List[str]]]:
+        return {edge_type: defaultdict(list) for edge_type in EdgeType}
+    
+    def _unindex_typed_edge(self, source_id: str, target_id: str, edge_type: EdgeType):
+        self._succ_by_type[edge_type][source_id].remove(target_id)
+        self._pred_by_type[edge_type][target_id].remove(source_id)
+    
+    def _rebuild_typed_adjacency(self):
+        """Rebuild the per-type adjacency buckets from self.graph"""
+        self._succ_by_type = self._empty_typed_adjacency()
+        self._pred_by_type = self._empty_typed_adjacency()
+        for u, nbrs in self.graph._succ.items():
+            for v, edge_data in nbrs.items():
+                edge_type = _EDGE_TYPES[edge_data["type_code"]]
+                self._succ_by_type[edge_type][u].append(v)
+                self._pred_by_type[edge_type][v].append(u)
+    
     def find_failure_causes(
         self,
         equipment_id: str
@@ -221,98 +662,121 @@ class GMAOKnowledgeGraph:
         if equipment_id not in self.graph:
             return []
         
+        nodes = self.graph._node
         failure_paths = []
         
         # Find components of this equipment
-        components = self.get_related_entities(
-            equipment_id,
-            edge_types=[EdgeType.HAS_COMPONENT],
-            max_hops=1,
-            direction="out"
-        )
+        components = self._classify_out_edges(equipment_id, {EdgeType.HAS_COMPONENT})
         
-        for component in components:
+        for component_id in components[EdgeType.HAS_COMPONENT]:
+            component_name = nodes[component_id]["name"]
+            
             # Find failure modes of this component
-            failure_modes = self.get_related_entities(
-                component.id,
-                edge_types=[EdgeType.FAILS_WITH],
-                max_hops=1,
-                direction="out"
-            )
+            failure_modes = self._classify_out_edges(component_id, {EdgeType.FAILS_WITH})
             
-            for fm in failure_modes:
-                # Find effects
-                effects = self.get_related_entities(
-                    fm.id,
-                    edge_types=[EdgeType.HAS_EFFECT],
-                    max_hops=1,
-                    direction="out"
-                )
+            for fm_id in failure_modes[EdgeType.FAILS_WITH]:
+                fm_data = nodes[fm_id]
                 
-                # Find causes
-                causes = self.get_related_entities(
-                    fm.id,
-                    edge_types=[EdgeType.CAUSED_BY],
-                    max_hops=1,
-                    direction="out"
-                )
-                
-                # Find interventions that fix this
-                interventions = self.get_related_entities(
-                    fm.id,
-                    edge_types=[EdgeType.FIXED_BY],
-                    max_hops=1,
-                    direction="out"
+                # Effects, causes and fixing interventions in one pass
+                linked = self._classify_out_edges(
+                    fm_id,
+                    {EdgeType.HAS_EFFECT, EdgeType.CAUSED_BY, EdgeType.FIXED_BY}
                 )
                 
                 failure_paths.append({
                     "equipment_id": equipment_id,
-                    "component": component.name,
-                    "component_id": component.id,
-                    "failure_mode": fm.name,
-                    "failure_mode_id": fm.id,
-                    "severity": fm.properties.get("severity"),
-                    "occurrence": fm.properties.get("occurrence"),
-                    "detection": fm.properties.get("detection"),
-                    "rpn": fm.properties.get("rpn"),
-                    "effects": [e.name for e in effects],
-                    "causes": [c.name for c in causes],
-                    "interventions": [i.name for i in interventions]
+                    "component": component_name,
+                    "component_id": component_id,
+                    "failure_mode": fm_data["name"],
+                    "failure_mode_id": fm_id,
+                    "severity": fm_data.get("severity"),
+                    "occurrence": fm_data.get("occurrence"),
+                    "detection": fm_data.get("detection"),
+                    "rpn": fm_data.get("rpn"),
+                    "effects": [nodes[nid]["name"] for nid in linked[EdgeType.HAS_EFFECT]],
+                    "causes": [nodes[nid]["name"] for nid in linked[EdgeType.CAUSED_BY]],
+                    "interventions": [nodes[nid]["name"] for nid in linked[EdgeType.FIXED_BY]]
                 })
         
         return failure_paths
     
+    def _classify_out_edges(
+        self,
+        node_id: str,
+        allowed_types: Set[EdgeType]
+    ) -> Dict[EdgeType, List[str]]:
+        """Out-neighbors of a node, bucketed by the requested edge types"""
+        return {
+            edge_type: list(self._succ_by_type[edge_type].get(node_id, ()))
+            for edge_type in allowed_types
+        }
+    
     def find_related_documents(
         self,
         entity_id: str
     ) -> List[GraphNode]:
         """Find documents that describe an entity"""
-        return self.get_related_entities(
-            entity_id,
-            edge_types=[EdgeType.DESCRIBED_IN],
-            max_hops=1,
-            direction="out"
-        )
+        return self._get_nodes(self._succ_by_type[EdgeType.DESCRIBED_IN].get(entity_id, ()))
     
     def get_nodes_by_type(self, node_type: NodeType) -> List[GraphNode]:
         """Get all nodes of a specific type"""
-        node_ids = self._nodes_by_type.get(node_type, set())
-        return [self.get_node(nid) for nid in node_ids if self.get_node(nid)]
+        return self._get_nodes(self._nodes_by_type.get(node_type, ()))
     
     def save(self, path: Optional[str] = None) -> bool:
-        """Save graph to disk"""
+        """
+        Save graph to disk as an .npz archive.
+        
+        Adjacency is stored as the out-edge CSR arrays plus a per-edge
+        confidence column; node/edge attributes and the name/type lookups
+        go into a compressed JSON blob (orjson, zstd or gzip) stored
+        alongside as a uint8 array.
+        """
         try:
-            save_path = Path(path) if path else self.store_path / "gmao_graph.pkl"
+            save_path = Path(path) if path else self.store_path / GRAPH_FILE
             save_path.parent.mkdir(parents=True, exist_ok=True)
             
-            data = {
-                "graph": self.graph,
+            if not self._csr_valid:
+                self._build_csr()
+            
+            # _build_csr emits edges grouped by source in node order, so this
+            # walk matches the CSR out-edge order
+            nodes = self.graph._node
+            succ = self.graph._succ
+            indptr, indices, etypes = self._csr_out
+            confidence = np.empty(len(indices), dtype=np.float64)
+            edge_attrs = []
+            j = 0
+            for u in self._node_ids:
+                for edge_data in succ[u].values():
+                    confidence[j] = edge_data.get("confidence", 1.0)
+                    edge_attrs.append({
+                        k: v for k, v in edge_data.items()
+                        if k not in ("type", "type_code", "confidence")
+                    })
+                    j += 1
+            
+            meta = {
+                "version": _GRAPH_FORMAT_VERSION,
+                "edge_types": list(_EDGE_TYPE_INDEX),
+                "node_ids": self._node_ids,
+                "node_attrs": [nodes[nid] for nid in self._node_ids],
+                "edge_attrs": edge_attrs,
                 "node_by_name": self._node_by_name,
-                "nodes_by_type": {k.value: list(v) for k, v in self._nodes_by_type.items()}
+                "nodes_by_type": {
+                    k.label: list(dict.fromkeys(v)) for k, v in self._nodes_by_type.items()
+                }
             }
+            meta_bytes = _compress_meta(orjson.dumps(meta, option=orjson.OPT_SERIALIZE_NUMPY))
             
             with open(save_path, 'wb') as f:
-                pickle.dump(data, f)
+                np.savez(
+                    f,
+                    indptr=indptr,
+                    indices=indices,
+                    etype=etypes,
+                    confidence=confidence,
+                    meta=np.frombuffer(meta_bytes, dtype=np.uint8)
+                )
             
             logger.info(f"Saved knowledge graph to {save_path}")
             return True
@@ -322,30 +786,97 @@ class GMAOKnowledgeGraph:
             return False
     
     def load(self, path: str) -> bool:
-        """Load graph from disk"""
+        """Load graph from disk (.npz archive, or a legacy pickle)"""
         try:
             with open(path, 'rb') as f:
-                data = pickle.load(f)
+                magic = f.read(2)
+            if magic != b"PK":
+                return self._legacy_load_pickle(path)
+            
+            with np.load(path, allow_pickle=False) as archive:
+                indptr = archive["indptr"]
+                indices = archive["indices"]
+                stored_etypes = archive["etype"]
+                confidence = archive["confidence"]
+                meta = orjson.loads(_decompress_meta(archive["meta"].tobytes()))
             
-            self.graph = data["graph"]
-            self._node_by_name = data.get("node_by_name", {})
+            node_ids: List[str] = meta["node_ids"]
+            n_nodes = len(node_ids)
+            sources = np.repeat(np.arange(n_nodes, dtype=np.int32), np.diff(indptr))
             
-            # Reconstruct nodes_by_type
-            nodes_by_type_raw = data.get("nodes_by_type", {})
-            self._nodes_by_type = defaultdict(set)
-            for type_str, node_ids in nodes_by_type_raw.items():
-                self._nodes_by_type[NodeType(type_str)] = set(node_ids)
+            # Remap stored edge-type codes in case EdgeType members moved
+            stored_types = meta["edge_types"]
+            remap = np.array([_EDGE_TYPE_INDEX[value] for value in stored_types], dtype=np.int8)
+            etypes = remap[stored_etypes]
             
+            graph = nx.DiGraph()
+            graph.add_nodes_from(zip(node_ids, meta["node_attrs"]))
+            graph.add_edges_from(
+                (
+                    node_ids[u],
+                    node_ids[v],
+                    {**attrs, "type": stored_types[t], "type_code": code, "confidence": c}
+                )
+                for u, v, t, code, c, attrs in zip(
+                    sources.tolist(),
+                    indices.tolist(),
+                    stored_etypes.tolist(),
+                    etypes.tolist(),
+                    confidence.tolist(),
+                    meta["edge_attrs"]
+                )
+            )
+            
+            self.graph = graph
+            self._restore_lookups(meta["node_by_name"], meta["nodes_by_type"])
+            
+            self._node_ids = node_ids
+            self._node_index = {nid: i for i, nid in enumerate(node_ids)}
+            self._csr_out = (indptr, indices, etypes)
+            self._csr_in = self._to_csr(indices, sources, etypes, n_nodes)
+            self._csr_valid = True
             return True
             
         except Exception as e:
             logger.error(f"Failed to load graph: {e}")
             return False
     
+    def _legacy_load_pickle(self, path: str) -> bool:
+        """Load a graph saved by the previous pickle-based format"""
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        
+        self.graph = data["graph"]
+        for _, _, edge_data in self.graph.edges(data=True):
+            edge_data["type_code"] = _EDGE_TYPE_INDEX[edge_data["type"]]
+        self._restore_lookups(data.get("node_by_name", {}), data.get("nodes_by_type", {}))
+        
+        self._build_csr()
+        return True
+    
+    def _restore_lookups(
+        self,
+        node_by_name: Dict[str, str],
+        nodes_by_type_raw: Dict[str, List[str]]
+    ):
+        """Rebuild in-memory lookups after replacing self.graph"""
+        self._node_cache = {}
+        self._connectivity_cache = None
+        self._rebuild_typed_adjacency()
+        self._node_by_name = {sys.intern(name): node_id for name, node_id in node_by_name.items()}
+        
+        self._nodes_by_type = defaultdict(list)
+        for type_str, node_ids in nodes_by_type_raw.items():
+            self._nodes_by_type[NodeType.from_label(type_str)] = list(dict.fromkeys(node_ids))
+        
+        self._reset_name_index()
+        for name_lower in self._node_by_name:
+            self._index_name(name_lower)
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get graph statistics"""
         type_counts = {
-            node_type.value: len(node_ids)
+            node_type.label: len(node_ids)
             for node_type, node_ids in self._nodes_by_type.items()
         }
         
@@ -354,14 +885,32 @@ class GMAOKnowledgeGraph:
             "total_nodes": self.graph.number_of_nodes(),
             "total_edges": self.graph.number_of_edges(),
             "node_types": type_counts,
-            "is_connected": nx.is_weakly_connected(self.graph) if self.graph.number_of_nodes() > 0 else False
+            "is_connected": self._is_weakly_connected()
         }
     
+    def _is_weakly_connected(self) -> bool:
+        if self.graph.number_of_nodes() == 0:
+            return False
+        if self._connectivity_cache is None:
+            self._connectivity_cache = nx.is_weakly_connected(self.graph)
+        return self._connectivity_cache
+    
     def clear(self):
         """Clear the graph"""
         self.graph.clear()
         self._node_by_name.clear()
         self._nodes_by_type.clear()
+        self._node_cache.clear()
+        self._succ_by_type = self._empty_typed_adjacency()
+        self._pred_by_type = self._empty_typed_adjacency()
+        self._reset_name_index()
+        self._csr_valid = False
+        self._connectivity_cache = None
+    
+    def _reset_name_index(self):
+        self._trigram_index = defaultdict(set)
+        self._indexed_names = {}
+        self._short_names = set()
 
 
 # Global instance
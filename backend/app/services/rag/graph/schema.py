@@ -3,59 +3,89 @@ Knowledge Graph Schema
 Node and edge type definitions for GMAO knowledge graph
 """
 
-from enum import Enum
+from enum import IntEnum
 from dataclasses import dataclass, field
 from typing import Dict, Any, Optional
 
 
-class NodeType(Enum):
+class LabeledEnum(IntEnum):
+    """
+    Integer-valued enum carrying a stable string label.
+    
+    Members hash and compare as ints; the label is what gets serialized,
+    so stored graphs don't depend on member order.
+    """
+    
+    def __new__(cls, code: int, label: str):
+        member = int.__new__(cls, code)
+        member._value_ = code
+        member.label = label
+        return member
+    
+    @classmethod
+    def from_label(cls, label: str):
+        return cls._by_label[label]
+    
+    @classmethod
+    def _missing_(cls, value):
+        # Accept the string label too (e.g. NodeType("equipment"))
+        if isinstance(value, str):
+            return cls._by_label.get(value)
+        return None
+
+
+class NodeType(LabeledEnum):
     """Types of nodes in the knowledge graph"""
-    EQUIPMENT = "equipment"
-    COMPONENT = "component"
-    FAILURE_MODE = "failure_mode"
-    EFFECT = "effect"
-    CAUSE = "cause"
-    INTERVENTION = "intervention"
-    SPARE_PART = "spare_part"
-    DOCUMENT = "document"
-    DOCUMENT_SECTION = "document_section"
-    TECHNICIAN = "technician"
-    SKILL = "skill"
+    EQUIPMENT = 0, "equipment"
+    COMPONENT = 1, "component"
+    FAILURE_MODE = 2, "failure_mode"
+    EFFECT = 3, "effect"
+    CAUSE = 4, "cause"
+    INTERVENTION = 5, "intervention"
+    SPARE_PART = 6, "spare_part"
+    DOCUMENT = 7, "document"
+    DOCUMENT_SECTION = 8, "document_section"
+    TECHNICIAN = 9, "technician"
+    SKILL = 10, "skill"
 
 
-class EdgeType(Enum):
+class EdgeType(LabeledEnum):
     """Types of edges (relationships) in the knowledge graph"""
     # Equipment relationships
-    HAS_COMPONENT = "has_component"
-    PART_OF = "part_of"
+    HAS_COMPONENT = 0, "has_component"
+    PART_OF = 1, "part_of"
     
     # Failure relationships
-    FAILS_WITH = "fails_with"
-    CAUSES = "causes"
-    CAUSED_BY = "caused_by"
-    HAS_EFFECT = "has_effect"
+    FAILS_WITH = 2, "fails_with"
+    CAUSES = 3, "causes"
+    CAUSED_BY = 4, "caused_by"
+    HAS_EFFECT = 5, "has_effect"
     
     # Maintenance relationships
-    FIXED_BY = "fixed_by"
-    USES_SPARE_PART = "uses_spare_part"
-    REPLACED_WITH = "replaced_with"
+    FIXED_BY = 6, "fixed_by"
+    USES_SPARE_PART = 7, "uses_spare_part"
+    REPLACED_WITH = 8, "replaced_with"
     
     # Documentation relationships
-    DESCRIBED_IN = "described_in"
-    REFERENCES = "references"
-    CONTAINS_SECTION = "contains_section"
+    DESCRIBED_IN = 9, "described_in"
+    REFERENCES = 10, "references"
+    CONTAINS_SECTION = 11, "contains_section"
     
     # Personnel relationships
-    PERFORMED_BY = "performed_by"
-    REQUIRES_SKILL = "requires_skill"
-    HAS_SKILL = "has_skill"
+    PERFORMED_BY = 12, "performed_by"
+    REQUIRES_SKILL = 13, "requires_skill"
+    HAS_SKILL = 14, "has_skill"
     
     # AMDEC/FMEA specific
-    MITIGATED_BY = "mitigated_by"
-    DETECTED_BY = "detected_by"
+    MITIGATED_BY = 15, "mitigated_by"
+    DETECTED_BY = 16, "detected_by"
+
+
+NodeType._by_label = {member.label: member for member in NodeType}
+EdgeType._by_label = {member.label: member for member in EdgeType}
 
 
-@dataclass
+@dataclass(slots=True)
 class GraphNode:
     """A node in the knowledge graph"""
     id: str
@@ -70,7 +100,7 @@ class GraphNode:
     def to_dict(self) -> Dict[str, Any]:
         return {
             "id": self.id,
-            "type": self.type.value,
+            "type": self.type.label,
             "name": self.name,
             "properties": self.properties,
             "source_type": self.source_type,
@@ -81,7 +111,7 @@ class GraphNode:
     def from_dict(cls, data: Dict[str, Any]) -> "GraphNode":
         return cls(
             id=data["id"],
-            type=NodeType(data["type"]),
+            type=NodeType.from_label(data["type"]),
             name=data["name"],
             properties=data.get("properties", {}),
             source_type=data.get("source_type"),
@@ -89,7 +119,7 @@ class GraphNode:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class GraphEdge:
     """An edge (relationship) in the knowledge graph"""
     source_id: str
@@ -105,7 +135,7 @@ class GraphEdge:
         return {
             "source_id": self.source_id,
             "target_id": self.target_id,
-            "type": self.type.value,
+            "type": self.type.label,
             "properties": self.properties,
             "confidence": self.confidence,
             "source": self.source
@@ -116,7 +146,7 @@ class GraphEdge:
         return cls(
             source_id=data["source_id"],
             target_id=data["target_id"],
-            type=EdgeType(data["type"]),
+            type=EdgeType.from_label(data["type"]),
             properties=data.get("properties", {}),
             confidence=data.get("confidence", 1.0),
             source=data.get("source")
@@ -4,26 +4,77 @@ Data structures for hierarchical document representation
 """
 
 import logging
-from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any
+from dataclasses import dataclass, field, fields, MISSING
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
-from enum import Enum
+
+import numpy as np
+
+from app.services.rag.graph.schema import LabeledEnum
 
 logger = logging.getLogger(__name__)
 
+# Combined relevance weighting for chunks retrieved within a section
+CHUNK_SCORE_WEIGHT = 0.7
+SECTION_SCORE_WEIGHT = 0.3
+
+
+class DocumentType(LabeledEnum):
+    """Types of GMAO documents (serialized by label)"""
+    MANUAL = 0, "manual"
+    PROCEDURE = 1, "procedure"
+    REPORT = 2, "report"
+    SPECIFICATION = 3, "specification"
+    TRAINING = 4, "training"
+    AMDEC_FMEA = 5, "amdec_fmea"
+    UNKNOWN = 6, "unknown"
 
-class DocumentType(Enum):
-    """Types of GMAO documents"""
-    MANUAL = "manual"
-    PROCEDURE = "procedure"
-    REPORT = "report"
-    SPECIFICATION = "specification"
-    TRAINING = "training"
-    AMDEC_FMEA = "amdec_fmea"
-    UNKNOWN = "unknown"
 
+# Label lookup, also used to read metadata pickled before the IntEnum switch (stored the label)
+DocumentType._by_label = {member.label: member for member in DocumentType}
 
-@dataclass
+
+def _record_getstate(self) -> Dict[str, Any]:
+    return {f.name: getattr(self, f.name) for f in fields(self)}
+
+
+def _record_setstate(self, state):
+    """
+    Restore a pickled record.
+    
+    Accepts dict state (current format, and pickles written before the
+    records were slotted) as well as the positional list used by default
+    for slotted dataclasses. Fields absent from older pickles get their
+    defaults.
+    """
+    if not isinstance(state, dict):
+        state = dict(zip((f.name for f in fields(self)), state))
+    for f in fields(self):
+        if f.name in state:
+            value = state[f.name]
+        elif f.default is not MISSING:
+            value = f.default
+        elif f.default_factory is not MISSING:
+            value = f.default_factory()
+        else:
+            continue
+        object.__setattr__(self, f.name, value)
+
+
+def _to_state(value):
+    """Convert records (recursively) to JSON-ready plain values"""
+    if isinstance(value, DocumentType):
+        return value.label
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return [_to_state(item) for item in value]
+    if hasattr(value, "__dataclass_fields__"):
+        return {f.name: _to_state(getattr(value, f.name)) for f in fields(value)}
+    return value
+
+
+@dataclass(slots=True)
 class ChunkMeta:
     """Metadata for a text chunk (finest granularity)"""
     chunk_id: str
@@ -47,6 +98,9 @@ class ChunkMeta:
     vector_id: Optional[str] = None
     embedding_cached: bool = False
     
+    __getstate__ = _record_getstate
+    __setstate__ = _record_setstate
+    
     def to_dict(self) -> Dict[str, Any]:
         return {
             "chunk_id": self.chunk_id,
@@ -62,7 +116,215 @@ class ChunkMeta:
         }
 
 
-@dataclass
+class ChunkArray:
+    """
+    Column-oriented (SoA) storage for ChunkMeta records.
+    
+    Scalar fields live in numpy columns, strings and lists in plain Python
+    lists. Rows are addressed by integer offset; ChunkMeta objects are only
+    built on demand via get().
+    """
+    
+    _MISSING = -1  # sentinel for Optional[int] columns
+    _COLUMNS = (
+        "_document_ids", "_chunk_indices", "_token_counts", "_page_numbers",
+        "_start_chars", "_end_chars", "_embedding_cached"
+    )
+    _LIST_COLUMNS = (
+        "chunk_ids", "section_ids", "subsection_ids", "texts",
+        "equipment_mentions", "part_numbers", "vector_ids"
+    )
+    
+    def __init__(self, capacity: int = 0):
+        self._size = 0
+        self._capacity = capacity
+        
+        self.chunk_ids: List[str] = []
+        self.section_ids: List[Optional[str]] = []
+        self.subsection_ids: List[Optional[str]] = []
+        self.texts: List[str] = []
+        self.equipment_mentions: List[List[str]] = []
+        self.part_numbers: List[List[str]] = []
+        self.vector_ids: List[Optional[str]] = []
+        
+        self._document_ids = np.empty(capacity, dtype=np.int32)
+        self._chunk_indices = np.empty(capacity, dtype=np.int32)
+        self._token_counts = np.empty(capacity, dtype=np.int32)
+        self._page_numbers = np.empty(capacity, dtype=np.int32)
+        self._start_chars = np.empty(capacity, dtype=np.int32)
+        self._end_chars = np.empty(capacity, dtype=np.int32)
+        self._embedding_cached = np.empty(capacity, dtype=np.bool_)
+    
+    @classmethod
+    def from_metas(cls, chunks: List[ChunkMeta]) -> "ChunkArray":
+        array = cls(capacity=len(chunks))
+        array.extend(chunks)
+        return array
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    # Scalar column views (length == len(self))
+    
+    @property
+    def document_ids(self) -> np.ndarray:
+        return self._document_ids[:self._size]
+    
+    @property
+    def chunk_indices(self) -> np.ndarray:
+        return self._chunk_indices[:self._size]
+    
+    @property
+    def token_counts(self) -> np.ndarray:
+        return self._token_counts[:self._size]
+    
+    @property
+    def page_numbers(self) -> np.ndarray:
+        """Page numbers, -1 where unknown"""
+        return self._page_numbers[:self._size]
+    
+    @property
+    def start_chars(self) -> np.ndarray:
+        return self._start_chars[:self._size]
+    
+    @property
+    def end_chars(self) -> np.ndarray:
+        return self._end_chars[:self._size]
+    
+    @property
+    def embedding_cached(self) -> np.ndarray:
+        return self._embedding_cached[:self._size]
+    
+    def _reserve(self, capacity: int):
+        if capacity <= self._capacity:
+            return
+        capacity = max(capacity, 2 * self._capacity, 64)
+        for name in self._COLUMNS:
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+        self._capacity = capacity
+    
+    def append(self, chunk: ChunkMeta) -> int:
+        """Append a chunk and return its offset"""
+        return self.append_row(
+            chunk_id=chunk.chunk_id,
+            document_id=chunk.document_id,
+            section_id=chunk.section_id,
+            subsection_id=chunk.subsection_id,
+            text=chunk.text,
+            chunk_index=chunk.chunk_index,
+            token_count=chunk.token_count,
+            page_number=chunk.page_number,
+            start_char=chunk.start_char,
+            end_char=chunk.end_char,
+            equipment_mentions=chunk.equipment_mentions,
+            part_numbers=chunk.part_numbers,
+            vector_id=chunk.vector_id,
+            embedding_cached=chunk.embedding_cached
+        )
+    
+    def append_row(
+        self,
+        chunk_id: str,
+        document_id: int,
+        section_id: Optional[str],
+        subsection_id: Optional[str],
+        text: str,
+        chunk_index: int,
+        token_count: int,
+        page_number: Optional[int] = None,
+        start_char: Optional[int] = None,
+        end_char: Optional[int] = None,
+        equipment_mentions: Optional[List[str]] = None,
+        part_numbers: Optional[List[str]] = None,
+        vector_id: Optional[str] = None,
+        embedding_cached: bool = False
+    ) -> int:
+        """Append a chunk given as fields (no ChunkMeta needed) and return its offset"""
+        self._reserve(self._size + 1)
+        i = self._size
+        missing = self._MISSING
+        
+        self.chunk_ids.append(chunk_id)
+        self.section_ids.append(section_id)
+        self.subsection_ids.append(subsection_id)
+        self.texts.append(text)
+        self.equipment_mentions.append(equipment_mentions if equipment_mentions is not None else [])
+        self.part_numbers.append(part_numbers if part_numbers is not None else [])
+        self.vector_ids.append(vector_id)
+        
+        self._document_ids[i] = document_id
+        self._chunk_indices[i] = chunk_index
+        self._token_counts[i] = token_count
+        self._page_numbers[i] = missing if page_number is None else page_number
+        self._start_chars[i] = missing if start_char is None else start_char
+        self._end_chars[i] = missing if end_char is None else end_char
+        self._embedding_cached[i] = embedding_cached
+        
+        self._size += 1
+        return i
+    
+    def extend(self, chunks: List[ChunkMeta]):
+        self._reserve(self._size + len(chunks))
+        for chunk in chunks:
+            self.append(chunk)
+    
+    def get(self, i: int) -> ChunkMeta:
+        """Materialize the chunk at offset i"""
+        if not 0 <= i < self._size:
+            raise IndexError(f"chunk offset {i} out of range")
+        
+        missing = self._MISSING
+        page_number = int(self._page_numbers[i])
+        start_char = int(self._start_chars[i])
+        end_char = int(self._end_chars[i])
+        
+        return ChunkMeta(
+            chunk_id=self.chunk_ids[i],
+            document_id=int(self._document_ids[i]),
+            section_id=self.section_ids[i],
+            subsection_id=self.subsection_ids[i],
+            text=self.texts[i],
+            chunk_index=int(self._chunk_indices[i]),
+            token_count=int(self._token_counts[i]),
+            page_number=None if page_number == missing else page_number,
+            start_char=None if start_char == missing else start_char,
+            end_char=None if end_char == missing else end_char,
+            equipment_mentions=self.equipment_mentions[i],
+            part_numbers=self.part_numbers[i],
+            vector_id=self.vector_ids[i],
+            embedding_cached=bool(self._embedding_cached[i])
+        )
+    
+    def to_state(self) -> Tuple[Dict[str, np.ndarray], Dict[str, list]]:
+        """Split into (numeric columns, list columns) for persistence"""
+        arrays = {name.lstrip("_"): getattr(self, name)[:self._size] for name in self._COLUMNS}
+        lists = {name: getattr(self, name) for name in self._LIST_COLUMNS}
+        return arrays, lists
+    
+    @classmethod
+    def from_state(cls, arrays: Dict[str, np.ndarray], lists: Dict[str, list]) -> "ChunkArray":
+        """Inverse of to_state"""
+        array = cls()
+        for name in cls._COLUMNS:
+            setattr(array, name, np.asarray(arrays[name.lstrip("_")]))
+        for name in cls._LIST_COLUMNS:
+            setattr(array, name, lists[name])
+        array._size = array._capacity = len(array.chunk_ids)
+        return array
+    
+    def __getstate__(self):
+        # Persist only the filled part of each column
+        state = self.__dict__.copy()
+        for name in self._COLUMNS:
+            state[name] = state[name][:self._size].copy()
+        state["_capacity"] = self._size
+        return state
+
+
+@dataclass(slots=True)
 class SectionMeta:
     """Metadata for a document section"""
     section_id: str
@@ -85,6 +347,12 @@ class SectionMeta:
     # Parent reference
     parent_section_id: Optional[str] = None
     
+    # "Chapter 2 > Maintenance" path, set by assign_full_paths
+    _full_path: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    
+    __getstate__ = _record_getstate
+    __setstate__ = _record_setstate
+    
     def to_dict(self) -> Dict[str, Any]:
         return {
             "section_id": self.section_id,
@@ -101,11 +369,33 @@ class SectionMeta:
     
     def get_full_path(self) -> str:
         """Get section path like 'Chapter 2 > Maintenance > Lubrication'"""
-        # This would be populated by the hierarchy builder
-        return self.title
+        return self._full_path or self.title
+    
+    def to_state(self) -> Dict[str, Any]:
+        """Full JSON-ready state (unlike to_dict, which is an API summary)"""
+        return _to_state(self)
+    
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "SectionMeta":
+        state = dict(state)
+        subsections = [cls.from_state(sub) for sub in state.pop("subsections", [])]
+        full_path = state.pop("_full_path", None)
+        section = cls(**state, subsections=subsections)
+        section._full_path = full_path
+        return section
+
+
+def assign_full_paths(sections: List[SectionMeta], parent_path: Optional[str] = None):
+    """Precompute get_full_path() for a section tree in one top-down pass"""
+    for section in sections:
+        section._full_path = (
+            f"{parent_path} > {section.title}" if parent_path else section.title
+        )
+        if section.subsections:
+            assign_full_paths(section.subsections, section._full_path)
 
 
-@dataclass
+@dataclass(slots=True)
 class DocumentMeta:
     """Metadata for a complete document"""
     document_id: int
@@ -132,12 +422,15 @@ class DocumentMeta:
     # Timestamps
     indexed_at: Optional[datetime] = None
     
+    __getstate__ = _record_getstate
+    __setstate__ = _record_setstate
+    
     def to_dict(self) -> Dict[str, Any]:
         return {
             "document_id": self.document_id,
             "filename": self.filename,
             "file_type": self.file_type,
-            "document_type": self.document_type.value,
+            "document_type": self.document_type.label,
             "total_pages": self.total_pages,
             "total_chunks": self.total_chunks,
             "section_count": len(self.sections),
@@ -146,9 +439,23 @@ class DocumentMeta:
             "indexed_at": self.indexed_at.isoformat() if self.indexed_at else None,
             "vector_id": self.vector_id
         }
+    
+    def to_state(self) -> Dict[str, Any]:
+        """Full JSON-ready state (unlike to_dict, which is an API summary)"""
+        return _to_state(self)
+    
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "DocumentMeta":
+        indexed_at = state.get("indexed_at")
+        return cls(**{
+            **state,
+            "document_type": DocumentType(state["document_type"]),
+            "sections": [SectionMeta.from_state(section) for section in state.get("sections", [])],
+            "indexed_at": datetime.fromisoformat(indexed_at) if indexed_at else None
+        })
 
 
-@dataclass
+@dataclass(slots=True)
 class HierarchicalResult:
     """Result from hierarchical retrieval"""
     # The actual chunk
@@ -159,22 +466,24 @@ class HierarchicalResult:
     section: Optional[SectionMeta]
     document: DocumentMeta
     
-    # Relevance scores
+    # Relevance scores (combined_score is computed by the caller, see combine_scores)
     chunk_score: float
     section_score: Optional[float] = None
     combined_score: float = 0.0
+
+
+def combine_scores(chunk_scores: np.ndarray, section_scores: np.ndarray) -> np.ndarray:
+    """
+    Vectorized combined score for a batch of candidates.
     
-    def __post_init__(self):
-        # Calculate combined score if not set
-        if self.combined_score == 0.0:
-            if self.section_score is not None:
-                # Weight: 70% chunk, 30% section
-                self.combined_score = 0.7 * self.chunk_score + 0.3 * self.section_score
-            else:
-                self.combined_score = self.chunk_score
+    Weights 70% chunk / 30% section; candidates without a section score
+    (NaN) fall back to their chunk score.
+    """
+    section_scores = np.where(np.isnan(section_scores), chunk_scores, section_scores)
+    return CHUNK_SCORE_WEIGHT * chunk_scores + SECTION_SCORE_WEIGHT * section_scores
 
 
-@dataclass
+@dataclass(slots=True)
 class HierarchicalCitation:
     """Structured citation for RAG responses"""
     document_name: str
@@ -186,11 +495,17 @@ class HierarchicalCitation:
     subsection_title: Optional[str] = None
     
     page_number: Optional[int] = None
-    chunk_excerpt: str = ""
+    chunk_excerpt: str = ""  # truncated at construction (create_citation_from_result)
     relevance_score: float = 0.0
     
+    # Memoized to_string() output
+    _formatted: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    
     def to_string(self) -> str:
         """Format citation for display"""
+        if self._formatted is not None:
+            return self._formatted
+        
         parts = [self.document_name]
         
         if self.section_title:
@@ -202,7 +517,8 @@ class HierarchicalCitation:
         if self.page_number:
             parts.append(f"(p. {self.page_number})")
         
-        return " → ".join(parts)
+        self._formatted = " → ".join(parts)
+        return self._formatted
     
     def to_markdown(self) -> str:
         """Format citation as markdown"""
@@ -220,13 +536,13 @@ class HierarchicalCitation:
         return {
             "document_name": self.document_name,
             "document_id": self.document_id,
-            "document_type": self.document_type.value,
+            "document_type": self.document_type.label,
             "section_title": self.section_title,
             "section_path": self.section_path,
             "subsection_title": self.subsection_title,
             "page_number": self.page_number,
-            "excerpt": self.chunk_excerpt[:200] if self.chunk_excerpt else "",
-            "relevance_score": round(self.relevance_score, 4),
+            "excerpt": self.chunk_excerpt,
+            "relevance_score": self.relevance_score,
             "formatted": self.to_string()
         }
 
@@ -241,5 +557,5 @@ def create_citation_from_result(result: HierarchicalResult) -> HierarchicalCitat
         section_path=result.section.get_full_path() if result.section else None,
         page_number=result.chunk.page_number,
         chunk_excerpt=result.chunk_text[:200] if result.chunk_text else "",
-        relevance_score=result.combined_score
+        relevance_score=round(result.combined_score, 4)
     )
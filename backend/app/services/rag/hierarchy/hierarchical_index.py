@@ -3,24 +3,221 @@ Hierarchical Index
 Multi-level FAISS indices for document, section, and chunk retrieval
 """
 
+import asyncio
+import gzip
+import io
 import logging
+import mmap
+import os
 import pickle
+import threading
+from array import array
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import numpy as np
+import orjson
 
 import faiss
 
+# Try to import zstandard for snapshot compression, falls back to gzip
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
 from app.services.rag.config import rag_settings
 from app.services.rag.hierarchy.document_hierarchy import (
     DocumentMeta,
     SectionMeta,
     ChunkMeta,
-    HierarchicalResult
+    ChunkArray,
+    HierarchicalResult,
+    combine_scores
 )
 
 logger = logging.getLogger(__name__)
 
+METADATA_FILE = "metadata.npz"
+LEGACY_METADATA_FILE = "metadata.pkl"  # pickled metadata, still loadable
+CHUNK_TEXTS_FILE = "chunk_texts.bin"
+_METADATA_FORMAT_VERSION = 3  # v1 kept chunk texts, v2 chunk_to_section inside the metadata blob
+_NO_ID = -1  # unset entry in the dense id mappings
+
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _compress_snapshot(raw: bytes) -> bytes:
+    """Compress a snapshot archive (multi-threaded zstd if available, else gzip)"""
+    if ZSTD_AVAILABLE:
+        return zstandard.ZstdCompressor(level=3, threads=-1).compress(raw)
+    return gzip.compress(raw, compresslevel=1)
+
+
+def _decompress_snapshot(blob: bytes) -> bytes:
+    """Inverse of _compress_snapshot; the codec is detected from the magic bytes"""
+    if blob.startswith(_ZSTD_MAGIC):
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError(
+                "Hierarchical snapshot is zstd-compressed but zstandard is not installed"
+            )
+        return zstandard.ZstdDecompressor().decompress(blob)
+    if blob.startswith(_GZIP_MAGIC):
+        return gzip.decompress(blob)
+    return blob
+
+
+def _dense_ids(mapping: Dict[int, int], count: int) -> array:
+    """Convert a {faiss_id: faiss_id} dict over 0..count-1 to an int32 array"""
+    return array("i", (mapping.get(i, _NO_ID) for i in range(count)))
+
+
+def _prefetch_file(path: Path):
+    """
+    Start asynchronous readahead of a file into the page cache.
+    
+    The mapped chunk index is scanned front to back by flat search, so
+    warming the shared page cache at load avoids page-fault stalls on
+    the first queries. No-op where posix_fadvise is unavailable.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+class _ReadWriteLock:
+    """Many concurrent readers or one writer (FAISS add is not safe during search)"""
+    
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+    
+    def acquire_read(self):
+        with self._cond:
+            while self._writing:
+                self._cond.wait()
+            self._readers += 1
+    
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+    
+    def acquire_write(self):
+        with self._cond:
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._writing = True
+    
+    def release_write(self):
+        with self._cond:
+            self._writing = False
+            self._cond.notify_all()
+
+
+class ChunkTextStore:
+    """
+    Append-only chunk texts: UTF-8 bytes plus an int64 offset table.
+    
+    Persisted texts are memory-mapped from CHUNK_TEXTS_FILE and only
+    decoded when a result is built; texts added since the last save are
+    held in memory until save() appends them to the file.
+    """
+    
+    def __init__(self):
+        self._offsets = array("q", [0])  # text i is bytes offsets[i]:offsets[i+1]
+        self._mapped: Optional[mmap.mmap] = None
+        self._mapped_path: Optional[Path] = None
+        self._mapped_size = 0
+        self._pending = bytearray()
+    
+    @classmethod
+    def from_list(cls, texts: List[str]) -> "ChunkTextStore":
+        store = cls()
+        for text in texts:
+            store.append(text)
+        return store
+    
+    @classmethod
+    def from_bytes(cls, data: bytes, offsets: np.ndarray) -> "ChunkTextStore":
+        """In-memory store over already-encoded texts"""
+        store = cls()
+        store._offsets = array("q", offsets.astype(np.int64).tobytes())
+        store._pending = bytearray(data)
+        return store
+    
+    @classmethod
+    def load(cls, path: Path, offsets: np.ndarray) -> "ChunkTextStore":
+        """Map a saved text file; offsets come from the metadata archive"""
+        store = cls()
+        store._offsets = array("q", offsets.astype(np.int64).tobytes())
+        store._map(path, int(store._offsets[-1]))
+        return store
+    
+    def _map(self, path: Path, size: int):
+        if self._mapped is not None:
+            self._mapped.close()
+        self._mapped = None
+        if size:  # an empty file cannot be mapped
+            with open(path, "rb") as f:
+                self._mapped = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            if hasattr(mmap, "MADV_RANDOM"):
+                # Texts are only read for result pages: no readahead
+                self._mapped.madvise(mmap.MADV_RANDOM)
+        self._mapped_path = path
+        self._mapped_size = size
+    
+    def append(self, text: str):
+        encoded = text.encode("utf-8")
+        self._pending += encoded
+        self._offsets.append(self._offsets[-1] + len(encoded))
+    
+    def __getitem__(self, i: int) -> str:
+        start, end = self._offsets[i], self._offsets[i + 1]
+        if start >= self._mapped_size:
+            start -= self._mapped_size
+            end -= self._mapped_size
+            return self._pending[start:end].decode("utf-8")
+        return self._mapped[start:end].decode("utf-8")
+    
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+    
+    def __iter__(self) -> Iterator[str]:
+        return (self[i] for i in range(len(self)))
+    
+    def offsets(self) -> np.ndarray:
+        return np.frombuffer(self._offsets, dtype=np.int64)
+    
+    def to_bytes(self) -> bytes:
+        mapped = self._mapped[:] if self._mapped is not None else b""
+        return mapped + bytes(self._pending)
+    
+    def save(self, path: Path):
+        """Persist to path, appending only the new texts when it is the mapped file"""
+        total = self._offsets[-1]
+        if self._mapped_path == path and path.exists() and path.stat().st_size == self._mapped_size:
+            with open(path, "ab") as f:
+                f.write(self._pending)
+        else:
+            tmp_path = path.with_name(path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                if self._mapped is not None:
+                    f.write(self._mapped)
+                f.write(self._pending)
+            os.replace(tmp_path, path)
+        self._pending = bytearray()
+        self._map(path, total)
+
 
 class HierarchicalIndex:
     """
@@ -30,6 +227,10 @@ class HierarchicalIndex:
     1. Document index - document summaries (coarse)
     2. Section index - section summaries (medium)
     3. Chunk index - fine-grained chunks (detailed)
+    
+    Levels stay separate indices: stage 2 depends on the stage 1 result,
+    so they can never share one search call, and the chunk level has its
+    own index type (HNSW, quantized, mmapped, GPU).
     """
     
     def __init__(
@@ -48,18 +249,26 @@ class HierarchicalIndex:
         # Level 2: Section index  
         self.section_index: Optional[faiss.Index] = None
         self.section_metadata: Dict[int, SectionMeta] = {}
-        self.section_texts: Dict[int, str] = {}  # Section summaries
+        self.section_texts: List[str] = []  # Section summaries, indexed by faiss id
         self._section_next_id = 0
         
-        # Level 3: Chunk index
+        # Level 3: Chunk index (metadata row offset == chunk faiss id)
         self.chunk_index: Optional[faiss.Index] = None
-        self.chunk_metadata: Dict[int, ChunkMeta] = {}
-        self.chunk_texts: Dict[int, str] = {}
+        self.chunk_metadata: ChunkArray = ChunkArray()
+        self.chunk_texts = ChunkTextStore()  # indexed by faiss id
         self._chunk_next_id = 0
         
         # Mappings for hierarchy navigation
-        self._section_to_doc: Dict[int, int] = {}  # section_faiss_id -> doc_faiss_id
-        self._chunk_to_section: Dict[int, int] = {}  # chunk_faiss_id -> section_faiss_id
+        self._section_to_doc = array("i")  # int32 doc_faiss_id, indexed by section_faiss_id
+        # int32 section_faiss_id (or -1), indexed by chunk_faiss_id
+        self._chunk_to_section = array("i")
+        self._section_to_chunks: Dict[int, List[int]] = {}  # section_faiss_id -> chunk_faiss_ids
+        
+        # Set when the chunk index lives on GPU (see _move_chunk_index_to_gpu)
+        self._gpu_resources = None
+        
+        # FAISS work runs in worker threads: searches share, adds are exclusive
+        self._lock = _ReadWriteLock()
         
         self._initialized = False
     
@@ -81,6 +290,9 @@ class HierarchicalIndex:
                 self._create_new_indices()
                 logger.info("Created new hierarchical indices")
             
+            if rag_settings.FAISS_USE_GPU:
+                self._move_chunk_index_to_gpu()
+            
             self._initialized = True
             return True
             
@@ -92,49 +304,107 @@ class HierarchicalIndex:
         """Create new empty FAISS indices"""
         self.document_index = faiss.IndexFlatIP(self.dimension)  # Inner product for cosine sim
         self.section_index = faiss.IndexFlatIP(self.dimension)
-        self.chunk_index = faiss.IndexFlatIP(self.dimension)
+        self.chunk_index = self._create_chunk_index()
         
         self.document_metadata = {}
         self.section_metadata = {}
-        self.chunk_metadata = {}
-        self.section_texts = {}
-        self.chunk_texts = {}
+        self.chunk_metadata = ChunkArray()
+        self.section_texts = []
+        self.chunk_texts = ChunkTextStore()
+        self._section_to_doc = array("i")
+        self._chunk_to_section = array("i")
+        self._section_to_chunks = {}
         
         self._doc_next_id = 0
         self._section_next_id = 0
         self._chunk_next_id = 0
     
+    def _create_chunk_index(self) -> faiss.Index:
+        """Create the chunk-level index (the largest level, so graph-based by default)"""
+        index_type = rag_settings.HIERARCHY_CHUNK_INDEX_TYPE.lower()
+        
+        if index_type == "flat":
+            return faiss.IndexFlatIP(self.dimension)
+        elif index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(
+                self.dimension,
+                rag_settings.FAISS_HNSW_M,
+                faiss.METRIC_INNER_PRODUCT
+            )
+            index.hnsw.efConstruction = rag_settings.FAISS_HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = rag_settings.FAISS_HNSW_EF_SEARCH
+            return index
+        elif index_type == "sq8":
+            # 1 byte per component with one global range: robust when trained
+            # on the first (small) document, see add_document
+            return faiss.IndexScalarQuantizer(
+                self.dimension,
+                faiss.ScalarQuantizer.QT_8bit_uniform,
+                faiss.METRIC_INNER_PRODUCT
+            )
+        elif index_type == "sqfp16":
+            # Half-precision codes, no training needed
+            return faiss.IndexScalarQuantizer(
+                self.dimension,
+                faiss.ScalarQuantizer.QT_fp16,
+                faiss.METRIC_INNER_PRODUCT
+            )
+        else:
+            raise ValueError(f"Unknown chunk index type: {index_type}")
+    
+    def _move_chunk_index_to_gpu(self):
+        """Move the chunk index to GPU 0 if a GPU build of FAISS and a device are available"""
+        if not hasattr(faiss, "StandardGpuResources") or faiss.get_num_gpus() == 0:
+            logger.warning(
+                "FAISS_USE_GPU is set but no GPU-enabled FAISS/device found, staying on CPU"
+            )
+            return
+        if not isinstance(self.chunk_index, faiss.IndexFlat):
+            logger.warning(
+                "GPU offload needs a flat chunk index (HIERARCHY_CHUNK_INDEX_TYPE=Flat), "
+                "staying on CPU"
+            )
+            return
+        
+        self._gpu_resources = faiss.StandardGpuResources()
+        self.chunk_index = faiss.index_cpu_to_gpu(self._gpu_resources, 0, self.chunk_index)
+        logger.info("Hierarchical chunk index moved to GPU")
+    
     def _load_indices(self) -> bool:
         """Load indices from disk"""
         try:
             doc_index_path = self.index_path / "document.index"
             section_index_path = self.index_path / "section.index"
             chunk_index_path = self.index_path / "chunk.index"
-            metadata_path = self.index_path / "metadata.pkl"
+            metadata_path = self.index_path / METADATA_FILE
+            legacy_metadata_path = self.index_path / LEGACY_METADATA_FILE
             
-            if not all(p.exists() for p in [doc_index_path, section_index_path, 
-                                            chunk_index_path, metadata_path]):
+            if not all(p.exists() for p in [doc_index_path, section_index_path, chunk_index_path]):
+                return False
+            if not (metadata_path.exists() or legacy_metadata_path.exists()):
                 return False
             
             # Load FAISS indices
             self.document_index = faiss.read_index(str(doc_index_path))
             self.section_index = faiss.read_index(str(section_index_path))
-            self.chunk_index = faiss.read_index(str(chunk_index_path))
+            # The chunk index is by far the largest: memory-map it so startup
+            # does not copy it into RAM and workers share the page cache
+            chunk_io_flags = (
+                faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+                if rag_settings.FAISS_MMAP_INDEX else 0
+            )
+            self.chunk_index = faiss.read_index(str(chunk_index_path), chunk_io_flags)
+            if rag_settings.FAISS_MMAP_INDEX:
+                _prefetch_file(chunk_index_path)
+            if isinstance(self.chunk_index, faiss.IndexHNSW):
+                self.chunk_index.hnsw.efSearch = rag_settings.FAISS_HNSW_EF_SEARCH
             
             # Load metadata
-            with open(metadata_path, 'rb') as f:
-                data = pickle.load(f)
-            
-            self.document_metadata = data.get("documents", {})
-            self.section_metadata = data.get("sections", {})
-            self.chunk_metadata = data.get("chunks", {})
-            self.section_texts = data.get("section_texts", {})
-            self.chunk_texts = data.get("chunk_texts", {})
-            self._section_to_doc = data.get("section_to_doc", {})
-            self._chunk_to_section = data.get("chunk_to_section", {})
-            self._doc_next_id = data.get("doc_next_id", 0)
-            self._section_next_id = data.get("section_next_id", 0)
-            self._chunk_next_id = data.get("chunk_next_id", 0)
+            if metadata_path.exists():
+                data = self._read_metadata(metadata_path)
+            else:
+                data = self._read_legacy_metadata(legacy_metadata_path)
+            self._apply_metadata(data)
             
             return True
             
@@ -142,32 +412,122 @@ class HierarchicalIndex:
             logger.warning(f"Failed to load indices: {e}")
             return False
     
+    def _apply_metadata(self, data: Dict[str, Any]):
+        """Install metadata read by one of the _read_* helpers"""
+        self.document_metadata = data["documents"]
+        self.section_metadata = data["sections"]
+        self.chunk_metadata = data["chunks"]
+        self.section_texts = data["section_texts"]
+        self.chunk_texts = data["chunk_texts"]
+        self._section_to_doc = data["section_to_doc"]
+        self._chunk_to_section = data["chunk_to_section"]
+        self._section_to_chunks = data.get("section_to_chunks")
+        if self._section_to_chunks is None:
+            # Older metadata: derive the reverse mapping
+            self._section_to_chunks = {}
+            for chunk_faiss_id, section_faiss_id in enumerate(self._chunk_to_section):
+                if section_faiss_id != _NO_ID:
+                    self._section_to_chunks.setdefault(section_faiss_id, []).append(chunk_faiss_id)
+        self._doc_next_id = data.get("doc_next_id", 0)
+        self._section_next_id = data.get("section_next_id", 0)
+        self._chunk_next_id = data.get("chunk_next_id", 0)
+    
+    @staticmethod
+    def _read_metadata(path: Path) -> Dict[str, Any]:
+        """Read metadata.npz: chunk columns as arrays plus an orjson blob"""
+        with np.load(path, allow_pickle=False) as archive:
+            return HierarchicalIndex._parse_metadata(archive, path.parent / CHUNK_TEXTS_FILE)
+    
+    @staticmethod
+    def _parse_metadata(archive, chunk_texts_path: Optional[Path]) -> Dict[str, Any]:
+        """Decode the metadata entries of an open npz archive (metadata.npz or a snapshot)"""
+        meta = orjson.loads(archive["meta"].tobytes())
+        chunk_arrays = {
+            name[len("chunk_"):]: archive[name]
+            for name in archive.files if name.startswith("chunk_")
+        }
+        section_to_doc = array("i", archive["section_to_doc"].astype(np.int32).tobytes())
+        if "chunk_to_section" in archive.files:
+            chunk_to_section = array("i", archive["chunk_to_section"].astype(np.int32).tobytes())
+        else:
+            chunk_to_section = _dense_ids(
+                {int(k): v for k, v in meta["chunk_to_section"].items()},
+                meta["chunk_next_id"]
+            )
+        if "text_data" in archive.files:
+            # Snapshot: texts are embedded in the archive
+            chunk_texts = ChunkTextStore.from_bytes(
+                archive["text_data"].tobytes(), archive["text_offsets"]
+            )
+        elif "text_offsets" in archive.files:
+            chunk_texts = ChunkTextStore.load(chunk_texts_path, archive["text_offsets"])
+        else:
+            chunk_texts = ChunkTextStore.from_list(meta["chunk_texts"])
+        
+        def int_keys(mapping: Dict[str, Any]) -> Dict[int, Any]:
+            return {int(k): v for k, v in mapping.items()}
+        
+        return {
+            "documents": {
+                int(k): DocumentMeta.from_state(v) for k, v in meta["documents"].items()
+            },
+            "sections": {
+                int(k): SectionMeta.from_state(v) for k, v in meta["sections"].items()
+            },
+            "chunks": ChunkArray.from_state(chunk_arrays, meta["chunks"]),
+            "section_texts": meta["section_texts"],
+            "chunk_texts": chunk_texts,
+            "section_to_doc": section_to_doc,
+            "chunk_to_section": chunk_to_section,
+            "section_to_chunks": int_keys(meta["section_to_chunks"]),
+            "doc_next_id": meta["doc_next_id"],
+            "section_next_id": meta["section_next_id"],
+            "chunk_next_id": meta["chunk_next_id"]
+        }
+    
+    @staticmethod
+    def _read_legacy_metadata(path: Path) -> Dict[str, Any]:
+        """Read the pickled metadata.pkl written by earlier versions"""
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        
+        chunks = data.get("chunks", ChunkArray())
+        if isinstance(chunks, dict):
+            # Pre-ChunkArray metadata: Dict[faiss_id, ChunkMeta], ids contiguous from 0
+            chunks = ChunkArray.from_metas([chunks[i] for i in range(len(chunks))])
+        
+        # Faiss ids are contiguous from 0, so the per-id dicts become arrays/lists
+        section_count = data.get("section_next_id", 0)
+        section_texts = data.get("section_texts", {})
+        chunk_texts = data.get("chunk_texts", {})
+        section_to_doc = data.get("section_to_doc", {})
+        
+        return {
+            "documents": data.get("documents", {}),
+            "sections": data.get("sections", {}),
+            "chunks": chunks,
+            "section_texts": [section_texts.get(i, "") for i in range(section_count)],
+            "chunk_texts": ChunkTextStore.from_list(
+                [chunk_texts.get(i, "") for i in range(data.get("chunk_next_id", 0))]
+            ),
+            "section_to_doc": _dense_ids(section_to_doc, section_count),
+            "chunk_to_section": _dense_ids(
+                data.get("chunk_to_section", {}), data.get("chunk_next_id", 0)
+            ),
+            "section_to_chunks": data.get("section_to_chunks"),
+            "doc_next_id": data.get("doc_next_id", 0),
+            "section_next_id": data.get("section_next_id", 0),
+            "chunk_next_id": data.get("chunk_next_id", 0)
+        }
+    
     def save(self) -> bool:
         """Save indices to disk"""
         try:
             self.index_path.mkdir(parents=True, exist_ok=True)
             
-            # Save FAISS indices
-            faiss.write_index(self.document_index, str(self.index_path / "document.index"))
-            faiss.write_index(self.section_index, str(self.index_path / "section.index"))
-            faiss.write_index(self.chunk_index, str(self.index_path / "chunk.index"))
-            
-            # Save metadata
-            data = {
-                "documents": self.document_metadata,
-                "sections": self.section_metadata,
-                "chunks": self.chunk_metadata,
-                "section_texts": self.section_texts,
-                "chunk_texts": self.chunk_texts,
-                "section_to_doc": self._section_to_doc,
-                "chunk_to_section": self._chunk_to_section,
-                "doc_next_id": self._doc_next_id,
-                "section_next_id": self._section_next_id,
-                "chunk_next_id": self._chunk_next_id
-            }
-            
-            with open(self.index_path / "metadata.pkl", 'wb') as f:
-                pickle.dump(data, f)
+            # Exclusive: saving flushes the pending chunk texts and remaps
+            # their file, which a concurrent add or search would still use
+            self._run_locked(True, self._save_files)
             
             logger.info("Saved hierarchical indices")
             return True
@@ -176,6 +536,141 @@ class HierarchicalIndex:
             logger.error(f"Failed to save indices: {e}")
             return False
     
+    def _save_files(self):
+        """Write the FAISS indices and metadata (caller holds the write lock)"""
+        self._save_faiss_indices()
+        self._save_metadata()
+    
+    def _save_faiss_indices(self):
+        """Write the three FAISS indices"""
+        chunk_index = (
+            faiss.index_gpu_to_cpu(self.chunk_index)
+            if self._gpu_resources is not None else self.chunk_index
+        )
+        for name, index in (
+            ("document.index", self.document_index),
+            ("section.index", self.section_index),
+            ("chunk.index", chunk_index)
+        ):
+            # Write aside and rename: a loaded index may still be memory-mapped
+            # from the old file, which must not be truncated under it
+            path = self.index_path / name
+            tmp_path = path.with_name(name + ".tmp")
+            faiss.write_index(index, str(tmp_path))
+            os.replace(tmp_path, path)
+    
+    def _save_metadata(self):
+        """Write metadata.npz: numeric chunk columns as arrays, the rest as an orjson blob"""
+        # Chunk texts go to their own append-only file, before the offsets
+        # that reference them
+        self.chunk_texts.save(self.index_path / CHUNK_TEXTS_FILE)
+        
+        with open(self.index_path / METADATA_FILE, 'wb') as f:
+            np.savez(f, **self._metadata_arrays())
+    
+    def _metadata_arrays(self) -> Dict[str, np.ndarray]:
+        """Metadata as named npz entries (chunk texts excluded)"""
+        chunk_arrays, chunk_lists = self.chunk_metadata.to_state()
+        meta = {
+            "version": _METADATA_FORMAT_VERSION,
+            "documents": {k: v.to_state() for k, v in self.document_metadata.items()},
+            "sections": {k: v.to_state() for k, v in self.section_metadata.items()},
+            "chunks": chunk_lists,
+            "section_texts": self.section_texts,
+            "section_to_chunks": self._section_to_chunks,
+            "doc_next_id": self._doc_next_id,
+            "section_next_id": self._section_next_id,
+            "chunk_next_id": self._chunk_next_id
+        }
+        meta_bytes = orjson.dumps(meta, option=orjson.OPT_NON_STR_KEYS)
+        
+        return {
+            "meta": np.frombuffer(meta_bytes, dtype=np.uint8),
+            "section_to_doc": np.frombuffer(self._section_to_doc, dtype=np.int32),
+            "chunk_to_section": np.frombuffer(self._chunk_to_section, dtype=np.int32),
+            "text_offsets": self.chunk_texts.offsets(),
+            **{f"chunk_{name}": column for name, column in chunk_arrays.items()}
+        }
+    
+    def save_snapshot(self, path: str) -> bool:
+        """
+        Write the whole index (three FAISS indices, metadata and chunk texts)
+        as a single compressed file, for shipping or warm-starting another
+        instance. The regular save() layout stays the one memory-mapped
+        at startup.
+        """
+        try:
+            # Searches may run alongside, adds must wait for a consistent copy
+            buffer = self._run_locked(False, self._snapshot_buffer)
+            
+            snapshot_path = Path(path)
+            tmp_path = snapshot_path.with_name(snapshot_path.name + ".tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(_compress_snapshot(buffer.getbuffer()))
+            os.replace(tmp_path, snapshot_path)
+            
+            logger.info(f"Saved hierarchical index snapshot to {path}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to save snapshot: {e}")
+            return False
+    
+    def _snapshot_buffer(self) -> io.BytesIO:
+        """Serialize indices and metadata into an npz buffer (caller holds the lock)"""
+        chunk_index = (
+            faiss.index_gpu_to_cpu(self.chunk_index)
+            if self._gpu_resources is not None else self.chunk_index
+        )
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            document_index=faiss.serialize_index(self.document_index),
+            section_index=faiss.serialize_index(self.section_index),
+            chunk_index=faiss.serialize_index(chunk_index),
+            text_data=np.frombuffer(self.chunk_texts.to_bytes(), dtype=np.uint8),
+            **self._metadata_arrays()
+        )
+        return buffer
+    
+    def load_snapshot(self, path: str) -> bool:
+        """Replace the in-memory index with a snapshot written by save_snapshot()"""
+        try:
+            with open(path, 'rb') as f:
+                raw = _decompress_snapshot(f.read())
+            
+            with np.load(io.BytesIO(raw), allow_pickle=False) as archive:
+                document_index = faiss.deserialize_index(archive["document_index"])
+                section_index = faiss.deserialize_index(archive["section_index"])
+                chunk_index = faiss.deserialize_index(archive["chunk_index"])
+                data = self._parse_metadata(archive, None)
+            
+            if isinstance(chunk_index, faiss.IndexHNSW):
+                chunk_index.hnsw.efSearch = rag_settings.FAISS_HNSW_EF_SEARCH
+            
+            # Swap everything at once, never in the middle of an add or search
+            self._run_locked(
+                True, self._install_snapshot, document_index, section_index, chunk_index, data
+            )
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to load snapshot: {e}")
+            return False
+    
+    def _install_snapshot(self, document_index, section_index, chunk_index, data: Dict[str, Any]):
+        """Replace indices and metadata with a loaded snapshot (caller holds the write lock)"""
+        self.document_index = document_index
+        self.section_index = section_index
+        self.chunk_index = chunk_index
+        self._gpu_resources = None
+        self._apply_metadata(data)
+        
+        if rag_settings.FAISS_USE_GPU:
+            self._move_chunk_index_to_gpu()
+        
+        self._initialized = True
+    
     async def add_document(
         self,
         doc_meta: DocumentMeta,
@@ -198,42 +693,84 @@ class HierarchicalIndex:
         if not self._initialized:
             raise RuntimeError("Index not initialized")
         
-        # Normalize embeddings for cosine similarity
-        doc_embedding = self._normalize(doc_embedding)
-        
-        # Add document
+        # FAISS calls block: run them off the event loop
+        return await asyncio.to_thread(
+            self._run_locked,
+            True,
+            self._add_document_sync,
+            doc_meta,
+            doc_embedding,
+            section_embeddings,
+            chunk_embeddings
+        )
+    
+    def _run_locked(self, exclusive: bool, func, *args):
+        """Run func under the index lock (worker-thread side of the async methods)"""
+        if exclusive:
+            self._lock.acquire_write()
+        else:
+            self._lock.acquire_read()
+        try:
+            return func(*args)
+        finally:
+            if exclusive:
+                self._lock.release_write()
+            else:
+                self._lock.release_read()
+    
+    def _add_document_sync(
+        self,
+        doc_meta: DocumentMeta,
+        doc_embedding: np.ndarray,
+        section_embeddings: Dict[str, Tuple[SectionMeta, np.ndarray, str]],
+        chunk_embeddings: Dict[str, Tuple[ChunkMeta, np.ndarray, str]]
+    ) -> int:
+        # Add document (vectors are L2-normalized for cosine similarity)
         doc_faiss_id = self._doc_next_id
-        self.document_index.add(doc_embedding.reshape(1, -1).astype(np.float32))
+        self.document_index.add(self._stack_embeddings([doc_embedding]))
         self.document_metadata[doc_faiss_id] = doc_meta
         self._doc_next_id += 1
         
-        # Add sections
+        # Add sections: one (N, d) matrix, one FAISS add. FAISS grows its
+        # code storage geometrically, so a single add per level keeps ingest
+        # to one append-copy of the new rows (no reserve() in the bindings).
         section_faiss_ids = {}
-        for section_id, (section_meta, section_emb, section_text) in section_embeddings.items():
-            section_emb = self._normalize(section_emb)
-            
-            section_faiss_id = self._section_next_id
-            self.section_index.add(section_emb.reshape(1, -1).astype(np.float32))
-            self.section_metadata[section_faiss_id] = section_meta
-            self.section_texts[section_faiss_id] = section_text
-            self._section_to_doc[section_faiss_id] = doc_faiss_id
-            section_faiss_ids[section_id] = section_faiss_id
-            self._section_next_id += 1
-        
-        # Add chunks
-        for chunk_id, (chunk_meta, chunk_emb, chunk_text) in chunk_embeddings.items():
-            chunk_emb = self._normalize(chunk_emb)
+        if section_embeddings:
+            section_matrix = self._stack_embeddings(
+                [section_emb for _, section_emb, _ in section_embeddings.values()]
+            )
+            self.section_index.add(section_matrix)
             
-            chunk_faiss_id = self._chunk_next_id
-            self.chunk_index.add(chunk_emb.reshape(1, -1).astype(np.float32))
-            self.chunk_metadata[chunk_faiss_id] = chunk_meta
-            self.chunk_texts[chunk_faiss_id] = chunk_text
-            
-            # Link to section
-            if chunk_meta.section_id in section_faiss_ids:
-                self._chunk_to_section[chunk_faiss_id] = section_faiss_ids[chunk_meta.section_id]
+            for section_id, (section_meta, _, section_text) in section_embeddings.items():
+                section_faiss_id = self._section_next_id
+                self.section_metadata[section_faiss_id] = section_meta
+                self.section_texts.append(section_text)
+                self._section_to_doc.append(doc_faiss_id)
+                section_faiss_ids[section_id] = section_faiss_id
+                self._section_next_id += 1
+        
+        # Add chunks: same batching
+        if chunk_embeddings:
+            chunk_matrix = self._stack_embeddings(
+                [chunk_emb for _, chunk_emb, _ in chunk_embeddings.values()]
+            )
+            if not self.chunk_index.is_trained:
+                # Quantized chunk index: learn the code range from the first batch
+                self.chunk_index.train(chunk_matrix)
+            self.chunk_index.add(chunk_matrix)
             
-            self._chunk_next_id += 1
+            for chunk_id, (chunk_meta, _, chunk_text) in chunk_embeddings.items():
+                chunk_faiss_id = self._chunk_next_id
+                self.chunk_metadata.append(chunk_meta)
+                self.chunk_texts.append(chunk_text)
+                
+                # Link to section
+                section_faiss_id = section_faiss_ids.get(chunk_meta.section_id, _NO_ID)
+                self._chunk_to_section.append(section_faiss_id)
+                if section_faiss_id != _NO_ID:
+                    self._section_to_chunks.setdefault(section_faiss_id, []).append(chunk_faiss_id)
+                
+                self._chunk_next_id += 1
         
         logger.info(
             f"Added document {doc_meta.document_id}: "
@@ -247,7 +784,8 @@ class HierarchicalIndex:
         query_embedding: np.ndarray,
         top_k_sections: int = 3,
         top_k_chunks_per_section: int = 5,
-        section_threshold: float = 0.5
+        section_threshold: float = 0.5,
+        normalized: bool = False
     ) -> List[HierarchicalResult]:
         """
         Two-stage hierarchical search.
@@ -256,10 +794,13 @@ class HierarchicalIndex:
         Stage 2: Find chunks within those sections
         
         Args:
-            query_embedding: Query vector
+            query_embedding: Query vector, shape (d,) or (1, d)
             top_k_sections: Number of sections to retrieve in stage 1
             top_k_chunks_per_section: Chunks per section in stage 2
             section_threshold: Minimum section score
+            normalized: Caller guarantees query_embedding is an L2-normalized
+                C-contiguous float32 vector; it is then searched as-is
+                (no copy, no normalization)
             
         Returns:
             List of HierarchicalResult with chunks and context
@@ -267,7 +808,28 @@ class HierarchicalIndex:
         if not self._initialized:
             raise RuntimeError("Index not initialized")
         
-        query_emb = self._normalize(query_embedding).reshape(1, -1).astype(np.float32)
+        # FAISS releases the GIL while searching, so concurrent queries
+        # overlap in worker threads instead of blocking the event loop
+        return await asyncio.to_thread(
+            self._run_locked,
+            False,
+            self._search_hierarchical_sync,
+            query_embedding,
+            top_k_sections,
+            top_k_chunks_per_section,
+            section_threshold,
+            normalized
+        )
+    
+    def _search_hierarchical_sync(
+        self,
+        query_embedding: np.ndarray,
+        top_k_sections: int,
+        top_k_chunks_per_section: int,
+        section_threshold: float,
+        normalized: bool
+    ) -> List[HierarchicalResult]:
+        query_emb = self._prepare_query(query_embedding, normalized)
         
         # Stage 1: Search sections
         if self.section_index.ntotal == 0:
@@ -278,67 +840,122 @@ class HierarchicalIndex:
             min(top_k_sections, self.section_index.ntotal)
         )
         
-        # Filter by threshold and collect section info
+        # Filter by threshold in one vector op, then collect section info
+        passing = (section_ids[0] >= 0) & (section_scores[0] >= section_threshold)
         relevant_sections = []
-        for score, section_faiss_id in zip(section_scores[0], section_ids[0]):
-            if section_faiss_id < 0 or score < section_threshold:
-                continue
-            
-            section_meta = self.section_metadata.get(int(section_faiss_id))
+        for score, section_faiss_id in zip(
+            section_scores[0][passing].tolist(),
+            section_ids[0][passing].tolist()
+        ):
+            section_meta = self.section_metadata.get(section_faiss_id)
             if section_meta:
-                relevant_sections.append((int(section_faiss_id), float(score), section_meta))
+                relevant_sections.append((section_faiss_id, score, section_meta))
         
         if not relevant_sections:
             # Fall back to direct chunk search
-            return await self._search_chunks_direct(query_emb, top_k_sections * top_k_chunks_per_section)
+            return self._search_chunks_direct(query_emb, top_k_sections * top_k_chunks_per_section)
+        
+        # Stage 2: Score the chunks of the relevant sections with a single
+        # chunk-index search restricted to their ids. Sections whose document
+        # is gone contribute nothing.
+        relevant_sections = [
+            (section_faiss_id, section_score, section_meta)
+            for section_faiss_id, section_score, section_meta in relevant_sections
+            if self._section_to_doc[section_faiss_id] in self.document_metadata
+        ]
+        section_chunks = [
+            self._section_to_chunks.get(section_faiss_id, ())
+            for section_faiss_id, _, _ in relevant_sections
+        ]
+        section_sizes = [len(chunk_ids) for chunk_ids in section_chunks]
+        candidate_ids = np.fromiter(
+            (chunk_faiss_id for chunk_ids in section_chunks for chunk_faiss_id in chunk_ids),
+            dtype=np.int64,
+            count=sum(section_sizes)
+        )
+        if len(candidate_ids) == 0:
+            return []
+        
+        # Position of each candidate's section in relevant_sections
+        candidate_sections = np.repeat(np.arange(len(relevant_sections)), section_sizes)
+        section_score_array = np.array([r[1] for r in relevant_sections], dtype=np.float64)
+        
+        chunk_scores, chunk_ids = self._score_chunks(query_emb, candidate_ids)
+        valid = (chunk_ids >= 0) & (chunk_ids < len(self.chunk_metadata))
+        chunk_scores, chunk_ids = chunk_scores[valid], chunk_ids[valid]
+        
+        # Bucket the best-first scored chunks back to their sections
+        sorter = np.argsort(candidate_ids)
+        positions = sorter[np.searchsorted(candidate_ids, chunk_ids, sorter=sorter)]
+        chunk_sections = np.take(candidate_sections, positions)
+        
+        # Keep the best top_k_chunks_per_section chunks of each section: rank
+        # within each section group, the stable sort preserving score order
+        by_section = np.argsort(chunk_sections, kind="stable")
+        grouped = chunk_sections[by_section]
+        group_starts = np.flatnonzero(np.r_[True, grouped[1:] != grouped[:-1]])
+        group_sizes = np.diff(np.r_[group_starts, len(grouped)])
+        rank = np.arange(len(grouped)) - np.repeat(group_starts, group_sizes)
+        keep = np.zeros(len(chunk_ids), dtype=bool)
+        keep[by_section[rank < top_k_chunks_per_section]] = True
+        
+        chunk_scores = chunk_scores[keep].astype(np.float64)
+        chunk_ids = chunk_ids[keep]
+        chunk_sections = chunk_sections[keep]
+        if len(chunk_ids) == 0:
+            return []
+        
+        # Combined scores for all candidates in one vector op
+        combined = combine_scores(chunk_scores, np.take(section_score_array, chunk_sections))
+        
+        # Rank by combined score (stable, like list.sort) and only
+        # materialize ChunkMeta for the returned top-k. The per-section cap
+        # already bounds the candidates to top_k_sections *
+        # top_k_chunks_per_section, so this sorts at most k scores.
+        order = np.argsort(-combined, kind="stable")[:top_k_sections * top_k_chunks_per_section]
         
-        # Stage 2: Search chunks within relevant sections
         results = []
+        for i in order.tolist():
+            chunk_faiss_id = int(chunk_ids[i])
+            section_faiss_id, section_score, section_meta = relevant_sections[chunk_sections[i]]
+            results.append(HierarchicalResult(
+                chunk=self.chunk_metadata.get(chunk_faiss_id),
+                chunk_text=self.chunk_texts[chunk_faiss_id],
+                section=section_meta,
+                document=self.document_metadata[self._section_to_doc[section_faiss_id]],
+                chunk_score=float(chunk_scores[i]),
+                section_score=section_score,
+                combined_score=float(combined[i])
+            ))
         
-        for section_faiss_id, section_score, section_meta in relevant_sections:
-            # Find chunks belonging to this section
-            section_chunk_ids = [
-                chunk_id for chunk_id, sec_id in self._chunk_to_section.items()
-                if sec_id == section_faiss_id
-            ]
-            
-            if not section_chunk_ids:
-                continue
-            
-            # Get embeddings for these chunks and search
-            for chunk_faiss_id in section_chunk_ids[:top_k_chunks_per_section]:
-                chunk_meta = self.chunk_metadata.get(chunk_faiss_id)
-                chunk_text = self.chunk_texts.get(chunk_faiss_id, "")
-                
-                if not chunk_meta:
-                    continue
-                
-                # Get document meta
-                doc_faiss_id = self._section_to_doc.get(section_faiss_id)
-                doc_meta = self.document_metadata.get(doc_faiss_id) if doc_faiss_id else None
-                
-                if not doc_meta:
-                    continue
-                
-                # Calculate chunk score (would normally search, simplified here)
-                # In full implementation, we'd search within section chunks
-                chunk_score = section_score * 0.9  # Approximate
-                
-                results.append(HierarchicalResult(
-                    chunk=chunk_meta,
-                    chunk_text=chunk_text,
-                    section=section_meta,
-                    document=doc_meta,
-                    chunk_score=chunk_score,
-                    section_score=section_score
-                ))
+        return results
+    
+    def _score_chunks(
+        self,
+        query_emb: np.ndarray,
+        candidate_ids: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score a subset of chunks against the query, best first.
         
-        # Sort by combined score
-        results.sort(key=lambda r: r.combined_score, reverse=True)
+        Flat indices run one search restricted to the subset. Filtered
+        HNSW search can miss members of a small subset, so graph indices
+        score the candidates' stored vectors exactly instead.
+        """
+        if isinstance(self.chunk_index, faiss.IndexFlat):
+            selector = faiss.IDSelectorBatch(len(candidate_ids), faiss.swig_ptr(candidate_ids))
+            scores, ids = self.chunk_index.search(
+                query_emb,
+                len(candidate_ids),
+                params=faiss.SearchParameters(sel=selector)
+            )
+            return scores[0], ids[0]
         
-        return results[:top_k_sections * top_k_chunks_per_section]
+        scores = self.chunk_index.reconstruct_batch(candidate_ids) @ query_emb[0]
+        order = np.argsort(-scores, kind="stable")
+        return scores[order], candidate_ids[order]
     
-    async def _search_chunks_direct(
+    def _search_chunks_direct(
         self,
         query_embedding: np.ndarray,
         top_k: int
@@ -352,43 +969,48 @@ class HierarchicalIndex:
             min(top_k, self.chunk_index.ntotal)
         )
         
+        # Work on plain ints/floats: results are built from ids and scores,
+        # and only the surviving hits get a ChunkMeta and HierarchicalResult
         results = []
-        for score, chunk_faiss_id in zip(scores[0], chunk_ids[0]):
-            if chunk_faiss_id < 0:
+        for score, chunk_faiss_id in zip(scores[0].tolist(), chunk_ids[0].tolist()):
+            if chunk_faiss_id < 0 or chunk_faiss_id >= len(self.chunk_metadata):
                 continue
             
-            chunk_meta = self.chunk_metadata.get(int(chunk_faiss_id))
-            chunk_text = self.chunk_texts.get(int(chunk_faiss_id), "")
-            
-            if not chunk_meta:
+            # Get section and document (a chunk without section has no document)
+            section_faiss_id = self._chunk_to_section[chunk_faiss_id]
+            if section_faiss_id == _NO_ID:
                 continue
             
-            # Get section and document
-            section_faiss_id = self._chunk_to_section.get(int(chunk_faiss_id))
-            section_meta = self.section_metadata.get(section_faiss_id) if section_faiss_id else None
-            
-            doc_faiss_id = self._section_to_doc.get(section_faiss_id) if section_faiss_id else None
-            doc_meta = self.document_metadata.get(doc_faiss_id) if doc_faiss_id else None
-            
+            doc_meta = self.document_metadata.get(self._section_to_doc[section_faiss_id])
             if not doc_meta:
                 continue
             
             results.append(HierarchicalResult(
-                chunk=chunk_meta,
-                chunk_text=chunk_text,
-                section=section_meta,
+                chunk=self.chunk_metadata.get(chunk_faiss_id),
+                chunk_text=self.chunk_texts[chunk_faiss_id],
+                section=self.section_metadata.get(section_faiss_id),
                 document=doc_meta,
-                chunk_score=float(score)
+                chunk_score=score,
+                combined_score=score  # no section score: chunk score only
             ))
         
         return results
     
-    def _normalize(self, embedding: np.ndarray) -> np.ndarray:
-        """L2 normalize embedding for cosine similarity"""
-        norm = np.linalg.norm(embedding)
-        if norm > 0:
-            return embedding / norm
-        return embedding
+    def _prepare_query(self, query_embedding: np.ndarray, normalized: bool) -> np.ndarray:
+        """Return the query as a (1, d) float32 matrix (a view if the caller normalized it)"""
+        if normalized:
+            assert query_embedding.dtype == np.float32 and query_embedding.flags["C_CONTIGUOUS"], \
+                "normalized queries must be C-contiguous float32"
+            return query_embedding.reshape(1, self.dimension)
+        return self._stack_embeddings([query_embedding])
+    
+    def _stack_embeddings(self, embeddings: List[np.ndarray]) -> np.ndarray:
+        """Copy embeddings into one C-contiguous float32 matrix, L2-normalized in place"""
+        matrix = np.empty((len(embeddings), self.dimension), dtype=np.float32)
+        for row, embedding in enumerate(embeddings):
+            matrix[row] = np.ravel(embedding)
+        faiss.normalize_L2(matrix)  # compiled SIMD kernel, one call for all rows
+        return matrix
     
     def get_stats(self) -> Dict[str, Any]:
         """Get index statistics"""
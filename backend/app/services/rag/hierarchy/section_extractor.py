@@ -3,17 +3,24 @@ Section Extractor
 Extracts hierarchical structure from PDF and document files
 """
 
+import asyncio
 import logging
+import os
 import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import List, Optional, Dict, Any, Tuple
 from dataclasses import dataclass
+from functools import lru_cache
+import numpy as np
 
 from app.services.rag.hierarchy.document_hierarchy import (
     DocumentMeta,
     SectionMeta,
-    ChunkMeta,
-    DocumentType
+    ChunkArray,
+    DocumentType,
+    assign_full_paths
 )
 
 logger = logging.getLogger(__name__)
@@ -22,12 +29,195 @@ logger = logging.getLogger(__name__)
 try:
     import fitz  # PyMuPDF
     PYMUPDF_AVAILABLE = True
+    # "dict" extraction without image blocks: their decoded pixel data is
+    # never used here and dominates parse cost on scanned/illustrated pages
+    PAGE_DICT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
 except ImportError:
     PYMUPDF_AVAILABLE = False
     logger.warning("PyMuPDF not installed. Install with: pip install PyMuPDF")
 
+# Reference patterns: each kind is one alternation with named groups so a
+# chunk is scanned once per kind
+EQUIPMENT_RE = re.compile(
+    r"(?:equipment|équipement|machine|pump|pompe|motor|moteur|valve|compressor)"
+    r"\s*[:-]?\s*(?P<tagged>[A-Z0-9][A-Z0-9\-_]+)"
+    r"|(?P<code>[A-Z]{2,4}[-_]?\d{2,5})",  # Equipment codes like "PMP-001"
+    re.IGNORECASE
+)
+PART_NUMBER_RE = re.compile(
+    r"(?:part|pièce|ref|référence)[:\s#]*(?P<ref>[A-Z0-9][-A-Z0-9]{3,20})"
+    r"|(?:P/N|PN)[:\s]*(?P<pn>[A-Z0-9][-A-Z0-9]{3,20})",
+    re.IGNORECASE
+)
+MAX_REFERENCES = 10  # per chunk and kind
+
+# Filename keyword -> document type, in precedence order (first listed wins
+# when a filename matches several types)
+DOCUMENT_TYPE_KEYWORDS: Dict[str, DocumentType] = {
+    "manual": DocumentType.MANUAL,
+    "manuel": DocumentType.MANUAL,
+    "guide": DocumentType.MANUAL,
+    "procedure": DocumentType.PROCEDURE,
+    "procédure": DocumentType.PROCEDURE,
+    "sop": DocumentType.PROCEDURE,
+    "report": DocumentType.REPORT,
+    "rapport": DocumentType.REPORT,
+    "spec": DocumentType.SPECIFICATION,
+    "specification": DocumentType.SPECIFICATION,
+    "amdec": DocumentType.AMDEC_FMEA,
+    "fmea": DocumentType.AMDEC_FMEA,
+    "fmeca": DocumentType.AMDEC_FMEA,
+    "training": DocumentType.TRAINING,
+    "formation": DocumentType.TRAINING,
+}
+
+
+def _find_references(regex: "re.Pattern", text: str) -> List[str]:
+    """First MAX_REFERENCES distinct captures of a named-group alternation, in text order"""
+    found: Dict[str, None] = {}
+    for match in regex.finditer(text):
+        found[match.group(match.lastgroup)] = None
+        if len(found) >= MAX_REFERENCES:
+            break
+    return list(found)
+
+
+def _count_tokens(chunk_text: str) -> int:
+    """Word count of a chunk from _split_into_chunks (words joined by single spaces)"""
+    return chunk_text.count(" ") + 1 if chunk_text else 0
+
+
+def _most_common_size(sizes: np.ndarray, default: float = 12.0) -> float:
+    """
+    Body font size: the most common span size (ties go to the size seen
+    first, like Counter.most_common).
+    """
+    if len(sizes) == 0:
+        return default
+    values, first_seen, counts = np.unique(sizes, return_index=True, return_counts=True)
+    tied = np.flatnonzero(counts == counts.max())
+    return float(values[tied[np.argmin(first_seen[tied])]])
+
+
+# First letters of a roman-numeral or chapter header (with the characters
+# IGNORECASE folds onto them); other letters need a "X." label
+_SECTION_PATTERN_INITIALS = frozenset("CISVcisv\u0130\u0131\u017f")
+
+
+@lru_cache(maxsize=4096)
+def _text_header_level(text: str) -> int:
+    """
+    Header level implied by a line's text alone (numbering patterns, then
+    section keywords), 0 if none. Cached: running headers, footers and
+    recurring titles repeat on every page.
+    """
+    # Check for numbered patterns (only lines that can start one: a digit,
+    # a one-letter label, a roman numeral or Chapter/Chapitre/Section)
+    if (text[:1].isdecimal() or text[1:2] == "."
+            or text[:1] in _SECTION_PATTERN_INITIALS):
+        match = SectionExtractor._SECTION_PATTERN_RE.match(text)
+        if match:
+            # Count dots for numbering depth
+            if match.lastgroup == "numbered":
+                dots = text.count('.')
+                return min(dots, 3)
+            elif match.lastgroup == "chapter":
+                return 1
+            else:
+                return 2
+    
+    # Check keywords
+    text_lower = text.lower()
+    for keyword, level in SectionExtractor._SECTION_KEYWORD_LEVELS:
+        if keyword in text_lower:
+            return level
+    
+    return 0
+
+
+def _read_page_lines(
+    page: "fitz.Page",
+    font_sizes: array
+) -> List[Tuple[str, float, bool, float]]:
+    """
+    Parse a PDF page once: append every span size to font_sizes and
+    return the (text, max_font_size, is_bold, y_position) of each line
+    long enough to be a header.
+    """
+    lines = []
+    blocks = page.get_text("dict", flags=PAGE_DICT_FLAGS)["blocks"]
+    # Locals for the per-span loop
+    append_size = font_sizes.append
+    bold_flag = fitz.TEXT_FONT_BOLD
+    
+    for block in blocks:
+        if block.get("type", 0) != 0 or "lines" not in block:
+            continue
+        
+        for line in block["lines"]:
+            # Get line text and properties
+            line_text = ""
+            max_font_size = 0
+            is_bold = False
+            y_pos = line["bbox"][1]
+            
+            for span in line["spans"]:
+                size = span["size"]
+                append_size(size)
+                line_text += span["text"]
+                if size > max_font_size:
+                    max_font_size = size
+                # MuPDF's bold flag; the font name only when a span has no
+                # style flags at all
+                if not is_bold:
+                    flags = span["flags"]
+                    is_bold = bool(
+                        flags & bold_flag
+                        or (not flags and "bold" in span["font"].lower())
+                    )
+            
+            line_text = line_text.strip()
+            if not line_text or len(line_text) < 3:
+                continue
+            
+            lines.append((line_text, max_font_size, is_bold, y_pos))
+    
+    return lines
+
+
+def _read_page_range(
+    file_path: str,
+    start: int,
+    stop: int
+) -> Tuple[array, List[List[Tuple[str, float, bool, float]]]]:
+    """Process-pool worker: open the PDF and read pages [start, stop)"""
+    font_sizes = array("d")
+    with fitz.open(file_path) as doc:
+        page_lines = [_read_page_lines(doc[i], font_sizes) for i in range(start, stop)]
+    return font_sizes, page_lines
 
-@dataclass
+
+# Worker processes for page parsing, started on the first large PDF and
+# reused for every later one
+_page_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_page_pool() -> ProcessPoolExecutor:
+    global _page_pool
+    if _page_pool is None:
+        _page_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+    return _page_pool
+
+
+def close_page_pool() -> None:
+    """Stop the page-parsing worker processes, if they were started"""
+    global _page_pool
+    if _page_pool is not None:
+        _page_pool.shutdown(cancel_futures=True)
+        _page_pool = None
+
+
+@dataclass(slots=True)
 class DetectedHeader:
     """Detected header in a document"""
     text: str
@@ -60,6 +250,15 @@ class SectionExtractor:
         # Chapter: "Chapter 1", "Chapitre 2"
         (r"^(Chapter|Chapitre|Section)\s+\d+[:\.]?\s*(.+)?$", "chapter"),
     ]
+    # All patterns fused into one anchored alternation; the matching branch
+    # (first in list order, as when trying them in turn) names the type
+    _SECTION_PATTERN_RE = re.compile(
+        "^(?:" + "|".join(
+            f"(?P<{pattern_type}>{pattern[1:-1]})"
+            for pattern, pattern_type in SECTION_PATTERNS
+        ) + ")$",
+        re.IGNORECASE
+    )
     
     # Keywords that often indicate sections
     SECTION_KEYWORDS = {
@@ -69,11 +268,22 @@ class SectionExtractor:
             "procedure", "procédure", "troubleshooting", "dépannage",
             "specifications", "spécifications", "installation"]
     }
+    # Flattened (keyword, level) pairs, level 1 keywords first
+    _SECTION_KEYWORD_LEVELS = tuple(
+        (keyword, level)
+        for level, keywords in SECTION_KEYWORDS.items()
+        for keyword in keywords
+    )
     
     # Minimum font size ratios for header detection
     MIN_H1_RATIO = 1.3  # 30% larger than body
     MIN_H2_RATIO = 1.15  # 15% larger than body
     
+    # Page parsing is spread over the process pool from this page count, so
+    # there are always at least two ranges to run side by side
+    PAGES_PER_TASK = 50
+    PARALLEL_MIN_PAGES = 2 * PAGES_PER_TASK
+    
     def __init__(self, chunk_size: int = 512, chunk_overlap: int = 50):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
@@ -125,55 +335,45 @@ class SectionExtractor:
             doc = fitz.open(file_path)
             doc_meta.total_pages = len(doc)
             
-            # First pass: detect body font size
-            font_sizes = []
-            for page in doc:
-                blocks = page.get_text("dict")["blocks"]
-                for block in blocks:
-                    if "lines" in block:
-                        for line in block["lines"]:
-                            for span in line["spans"]:
-                                font_sizes.append(span["size"])
-            
-            if font_sizes:
-                # Body font is typically the most common size
-                from collections import Counter
-                size_counts = Counter(font_sizes)
-                self._body_font_size = size_counts.most_common(1)[0][0]
+            # Single parse of each page: span sizes for the body font, and
+            # the candidate header lines classified once it is known
+            if len(doc) >= self.PARALLEL_MIN_PAGES and (os.cpu_count() or 1) > 1:
+                font_sizes, page_lines = await self._read_pages_parallel(file_path, len(doc))
             else:
-                self._body_font_size = 12.0
+                font_sizes = array("d")
+                page_lines = [_read_page_lines(page, font_sizes) for page in doc]
+            
+            self._body_font_size = _most_common_size(np.frombuffer(font_sizes, dtype=np.float64))
             
-            # Second pass: detect headers
+            # Detect headers from the collected lines
             headers = []
-            for page_num, page in enumerate(doc):
-                page_headers = self._detect_headers_in_page(page, page_num + 1)
-                headers.extend(page_headers)
+            for page_num, lines in enumerate(page_lines):
+                headers.extend(self._detect_headers_in_lines(lines, page_num + 1))
             
             # Build section hierarchy
             sections = self._build_section_hierarchy(headers, doc_meta.document_id)
             doc_meta.sections = sections
             
-            # Extract text and create chunks per section
-            all_chunks = []
+            # Extract text and create chunks per section, as columns (pages
+            # shared by adjacent sections are only decoded once)
+            all_chunks = ChunkArray()
+            page_texts: Dict[int, str] = {}
             for section in sections:
-                section_chunks = await self._extract_section_chunks(
-                    doc, section, doc_meta.document_id
+                section.chunk_ids = await self._extract_section_chunks(
+                    doc, section, doc_meta.document_id, all_chunks, page_texts
                 )
-                section.chunk_ids = [c.chunk_id for c in section_chunks]
-                all_chunks.extend(section_chunks)
             
             doc_meta.total_chunks = len(all_chunks)
             
             # Generate document summary from first section or intro
             if all_chunks:
-                first_chunks = all_chunks[:3]
-                summary_text = " ".join([c.text for c in first_chunks])[:500]
+                summary_text = " ".join(all_chunks.texts[:3])[:500]
                 doc_meta.summary = summary_text
             
             # Extract equipment mentions from all chunks
             equipment = set()
-            for chunk in all_chunks:
-                equipment.update(chunk.equipment_mentions)
+            for mentions in all_chunks.equipment_mentions:
+                equipment.update(mentions)
             doc_meta.equipment_covered = list(equipment)
             
             doc.close()
@@ -190,50 +390,57 @@ class SectionExtractor:
             # Fall back to text extraction
             return await self._extract_text_structure(file_path, doc_meta)
     
-    def _detect_headers_in_page(
+    async def _read_pages_parallel(
+        self,
+        file_path: str,
+        page_count: int
+    ) -> Tuple[array, List[List[Tuple[str, float, bool, float]]]]:
+        """Read page ranges in worker processes (PyMuPDF documents cannot be shared)"""
+        # At most one range per worker: each task reopens the PDF
+        pages_per_task = max(self.PAGES_PER_TASK, -(-page_count // (os.cpu_count() or 1)))
+        ranges = [
+            (start, min(start + pages_per_task, page_count))
+            for start in range(0, page_count, pages_per_task)
+        ]
+        loop = asyncio.get_running_loop()
+        pool = _get_page_pool()
+        
+        results = await asyncio.gather(*[
+            loop.run_in_executor(pool, _read_page_range, file_path, start, stop)
+            for start, stop in ranges
+        ])
+        
+        # Concatenate in page order (the body font tie-break is first-seen)
+        font_sizes = array("d")
+        page_lines = []
+        for range_sizes, range_lines in results:
+            font_sizes.extend(range_sizes)
+            page_lines.extend(range_lines)
+        return font_sizes, page_lines
+    
+    def _detect_headers_in_lines(
         self,
-        page: "fitz.Page",
+        lines: List[Tuple[str, float, bool, float]],
         page_number: int
     ) -> List[DetectedHeader]:
-        """Detect headers in a PDF page"""
+        """Detect headers among a page's lines (needs the body font size)"""
         headers = []
-        blocks = page.get_text("dict")["blocks"]
         
-        for block in blocks:
-            if "lines" not in block:
-                continue
+        for line_text, max_font_size, is_bold, y_pos in lines:
+            # Check if this looks like a header
+            header_level = self._detect_header_level(
+                line_text, max_font_size, is_bold
+            )
             
-            for line in block["lines"]:
-                # Get line text and properties
-                line_text = ""
-                max_font_size = 0
-                is_bold = False
-                y_pos = line["bbox"][1]
-                
-                for span in line["spans"]:
-                    line_text += span["text"]
-                    max_font_size = max(max_font_size, span["size"])
-                    if "bold" in span.get("font", "").lower():
-                        is_bold = True
-                
-                line_text = line_text.strip()
-                if not line_text or len(line_text) < 3:
-                    continue
-                
-                # Check if this looks like a header
-                header_level = self._detect_header_level(
-                    line_text, max_font_size, is_bold
-                )
-                
-                if header_level > 0:
-                    headers.append(DetectedHeader(
-                        text=line_text,
-                        level=header_level,
-                        page_number=page_number,
-                        font_size=max_font_size,
-                        is_bold=is_bold,
-                        y_position=y_pos
-                    ))
+            if header_level > 0:
+                headers.append(DetectedHeader(
+                    text=line_text,
+                    level=header_level,
+                    page_number=page_number,
+                    font_size=max_font_size,
+                    is_bold=is_bold,
+                    y_position=y_pos
+                ))
         
         return headers
     
@@ -249,7 +456,10 @@ class SectionExtractor:
         Returns:
             0 if not a header, 1-3 for header level
         """
-        text_lower = text.lower().strip()
+        # Check numbered patterns and keywords
+        level = _text_header_level(text)
+        if level:
+            return level
         
         # Check font size ratio
         if self._body_font_size:
@@ -257,25 +467,6 @@ class SectionExtractor:
         else:
             ratio = 1.0
         
-        # Check for numbered patterns
-        for pattern, pattern_type in self.SECTION_PATTERNS:
-            match = re.match(pattern, text, re.IGNORECASE)
-            if match:
-                # Count dots for numbering depth
-                if pattern_type == "numbered":
-                    dots = text.count('.')
-                    return min(dots, 3)
-                elif pattern_type == "chapter":
-                    return 1
-                else:
-                    return 2
-        
-        # Check keywords
-        for level, keywords in self.SECTION_KEYWORDS.items():
-            for keyword in keywords:
-                if keyword in text_lower:
-                    return level
-        
         # Check by font size
         if ratio >= self.MIN_H1_RATIO and is_bold:
             return 1
@@ -303,6 +494,8 @@ class SectionExtractor:
             )]
         
         sections = []
+        # Open ancestors in strictly increasing level order, so at most three
+        # deep (header levels are 1-3) and the scans below are O(1) per header
         section_stack: List[SectionMeta] = []
         
         for i, header in enumerate(headers):
@@ -334,62 +527,75 @@ class SectionExtractor:
             
             section_stack.append(section)
         
+        assign_full_paths(sections)
         return sections
     
     async def _extract_section_chunks(
         self,
         doc: "fitz.Document",
         section: SectionMeta,
-        document_id: int
-    ) -> List[ChunkMeta]:
-        """Extract text chunks for a section"""
-        chunks = []
+        document_id: int,
+        chunks: ChunkArray,
+        page_texts: Dict[int, str]
+    ) -> List[str]:
+        """
+        Append a section's text chunks to chunks and return their chunk ids.
+        page_texts caches page text by page index across sections.
+        """
+        chunk_ids = []
         
         page_start = section.page_start - 1  # 0-indexed
         page_end = (section.page_end or doc.page_count) - 1
         
         # Extract text from section pages
-        section_text = ""
+        parts = []
         for page_num in range(page_start, min(page_end + 1, doc.page_count)):
-            page = doc[page_num]
-            section_text += page.get_text() + "\n"
+            page_text = page_texts.get(page_num)
+            if page_text is None:
+                page_text = page_texts[page_num] = doc[page_num].get_text() + "\n"
+            parts.append(page_text)
+        section_text = "".join(parts)
         
         # Split into chunks
         text_chunks = self._split_into_chunks(section_text)
         
         for i, chunk_text in enumerate(text_chunks):
-            chunk = ChunkMeta(
-                chunk_id=f"{section.section_id}_chunk_{i}",
+            chunk_id = f"{section.section_id}_chunk_{i}"
+            chunks.append_row(
+                chunk_id=chunk_id,
                 document_id=document_id,
                 section_id=section.section_id,
                 subsection_id=None,
                 text=chunk_text,
                 chunk_index=i,
-                token_count=len(chunk_text.split()),
+                token_count=_count_tokens(chunk_text),
                 page_number=section.page_start + (i * self.chunk_size // 3000),  # Estimate
                 equipment_mentions=self._extract_equipment_mentions(chunk_text),
                 part_numbers=self._extract_part_numbers(chunk_text)
             )
-            chunks.append(chunk)
+            chunk_ids.append(chunk_id)
         
-        return chunks
+        return chunk_ids
     
     def _split_into_chunks(self, text: str) -> List[str]:
         """Split text into overlapping chunks"""
         if not text.strip():
             return []
         
+        # One C-level split, then joins: chunks come out single-spaced
+        # (_count_tokens relies on it), and per-word regex offsets to slice
+        # the original text instead cost far more than the joins
         words = text.split()
-        chunks = []
         
-        start = 0
-        while start < len(words):
-            end = min(start + self.chunk_size, len(words))
-            chunk_words = words[start:end]
-            chunks.append(" ".join(chunk_words))
-            start = end - self.chunk_overlap
+        # Windows of chunk_size words every (chunk_size - overlap) words,
+        # up to the first one that reaches the end of the text
+        stride = max(self.chunk_size - self.chunk_overlap, 1)
+        n_chunks = 1 + max(0, -(-(len(words) - self.chunk_size) // stride))
         
-        return chunks
+        return [
+            " ".join(words[start:start + self.chunk_size])
+            for start in range(0, n_chunks * stride, stride)
+        ]
     
     async def _extract_text_structure(
         self,
@@ -412,28 +618,28 @@ class SectionExtractor:
             
             # Create chunks
             text_chunks = self._split_into_chunks(content)
-            chunks = []
+            chunks = ChunkArray(capacity=len(text_chunks))
             
             for i, chunk_text in enumerate(text_chunks):
-                chunk = ChunkMeta(
-                    chunk_id=f"{section.section_id}_chunk_{i}",
+                chunk_id = f"{section.section_id}_chunk_{i}"
+                chunks.append_row(
+                    chunk_id=chunk_id,
                     document_id=doc_meta.document_id,
                     section_id=section.section_id,
                     subsection_id=None,
                     text=chunk_text,
                     chunk_index=i,
-                    token_count=len(chunk_text.split()),
+                    token_count=_count_tokens(chunk_text),
                     equipment_mentions=self._extract_equipment_mentions(chunk_text),
                     part_numbers=self._extract_part_numbers(chunk_text)
                 )
-                chunks.append(chunk)
-                section.chunk_ids.append(chunk.chunk_id)
+                section.chunk_ids.append(chunk_id)
             
             doc_meta.sections = [section]
             doc_meta.total_chunks = len(chunks)
             
             if chunks:
-                doc_meta.summary = chunks[0].text[:500]
+                doc_meta.summary = chunks.texts[0][:500]
             
             return doc_meta
             
@@ -449,49 +655,20 @@ class SectionExtractor:
         """Classify document type from filename and metadata"""
         filename_lower = filename.lower()
         
-        if any(kw in filename_lower for kw in ["manual", "manuel", "guide"]):
-            return DocumentType.MANUAL
-        elif any(kw in filename_lower for kw in ["procedure", "procédure", "sop"]):
-            return DocumentType.PROCEDURE
-        elif any(kw in filename_lower for kw in ["report", "rapport"]):
-            return DocumentType.REPORT
-        elif any(kw in filename_lower for kw in ["spec", "specification"]):
-            return DocumentType.SPECIFICATION
-        elif any(kw in filename_lower for kw in ["amdec", "fmea", "fmeca"]):
-            return DocumentType.AMDEC_FMEA
-        elif any(kw in filename_lower for kw in ["training", "formation"]):
-            return DocumentType.TRAINING
+        for keyword, document_type in DOCUMENT_TYPE_KEYWORDS.items():
+            if keyword in filename_lower:
+                return document_type
         
         return DocumentType.UNKNOWN
     
     def _extract_equipment_mentions(self, text: str) -> List[str]:
         """Extract equipment references from text"""
         # Simple pattern matching - could be enhanced with NER
-        patterns = [
-            r"(?:equipment|équipement|machine|pump|pompe|motor|moteur|valve|compressor)\s*[:-]?\s*([A-Z0-9][A-Z0-9\-_]+)",
-            r"([A-Z]{2,4}[-_]?\d{2,5})",  # Equipment codes like "PMP-001"
-        ]
-        
-        mentions = set()
-        for pattern in patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            mentions.update(matches)
-        
-        return list(mentions)[:10]  # Limit to 10
+        return _find_references(EQUIPMENT_RE, text)
     
     def _extract_part_numbers(self, text: str) -> List[str]:
         """Extract part numbers from text"""
-        patterns = [
-            r"(?:part|pièce|ref|référence)[:\s#]*([A-Z0-9][-A-Z0-9]{3,20})",
-            r"(?:P/N|PN)[:\s]*([A-Z0-9][-A-Z0-9]{3,20})",
-        ]
-        
-        parts = set()
-        for pattern in patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            parts.update(matches)
-        
-        return list(parts)[:10]
+        return _find_references(PART_NUMBER_RE, text)
 
 
 # Global instance
@@ -53,7 +53,8 @@ class TwoStageRetriever:
         top_k_sections: Optional[int] = None,
         top_k_chunks: Optional[int] = None,
         document_filter: Optional[List[int]] = None,
-        section_filter: Optional[List[str]] = None
+        section_filter: Optional[List[str]] = None,
+        normalized: bool = False
     ) -> List[HierarchicalResult]:
         """
         Perform two-stage hierarchical retrieval.
@@ -64,9 +65,12 @@ class TwoStageRetriever:
             top_k_chunks: Override default chunk count
             document_filter: Only search in these document IDs
             section_filter: Only search in these section IDs
+            normalized: query_embedding is already an L2-normalized float32
+                vector (skips the per-query copy)
             
         Returns:
-            List of HierarchicalResult sorted by relevance
+            List of HierarchicalResult sorted by relevance (scores are the
+            index's inner products; nothing is re-scored here)
         """
         if not self._initialized:
             await self.initialize()
@@ -79,20 +83,18 @@ class TwoStageRetriever:
             query_embedding=query_embedding,
             top_k_sections=k_sections,
             top_k_chunks_per_section=k_chunks,
-            section_threshold=self.section_threshold
+            section_threshold=self.section_threshold,
+            normalized=normalized
         )
         
-        # Apply filters if provided
-        if document_filter:
+        # Apply filters if provided (set lookups, one pass over results)
+        if document_filter or section_filter:
+            document_ids = frozenset(document_filter) if document_filter else None
+            section_ids = frozenset(section_filter) if section_filter else None
             results = [
                 r for r in results
-                if r.document.document_id in document_filter
-            ]
-        
-        if section_filter:
-            results = [
-                r for r in results
-                if r.section and r.section.section_id in section_filter
+                if (document_ids is None or r.document.document_id in document_ids)
+                and (section_ids is None or (r.section and r.section.section_id in section_ids))
             ]
         
         logger.debug(
@@ -143,7 +145,9 @@ class TwoStageRetriever:
             return ""
         
         context_parts = []
-        current_tokens = 0
+        current_tokens = 0  # exact word count of context_parts[:counted]
+        counted = 0
+        bound = 0  # current_tokens + upper bound for the uncounted parts
         
         for result in results:
             # Build chunk context
@@ -163,13 +167,23 @@ class TwoStageRetriever:
             parts.append(result.chunk_text)
             
             chunk_context = "\n".join(parts)
-            chunk_tokens = len(chunk_context.split())
             
-            if current_tokens + chunk_tokens > max_tokens:
-                break
+            # n characters hold at most (n + 1) // 2 words: words are only
+            # counted once that bound no longer clears the budget
+            bound += (len(chunk_context) + 1) // 2
+            if bound > max_tokens:
+                for part in context_parts[counted:]:
+                    current_tokens += len(part.split())
+                chunk_tokens = len(chunk_context.split())
+                
+                if current_tokens + chunk_tokens > max_tokens:
+                    break
+                
+                current_tokens += chunk_tokens
+                counted = len(context_parts) + 1
+                bound = current_tokens
             
             context_parts.append(chunk_context)
-            current_tokens += chunk_tokens
         
         return "\n\n---\n\n".join(context_parts)
     
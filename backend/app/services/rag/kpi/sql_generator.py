@@ -3,15 +3,27 @@ SQL Generator Service
 Safely converts natural language to SQL queries for specific tables.
 """
 
+import asyncio
+import hashlib
+import json
 import logging
+import re
 from typing import Optional, Dict, Any, List
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from app.services.rag.llm.provider_factory import LLMProviderFactory
-from app.models import Equipment, Intervention, Technician, FailureMode
+from app.services.rag.cache_service import cache_service
+from app.services.rag.config import rag_settings
+from app.services.rag.llm.base import LLMMessage
+from app.services.rag.llm.provider_factory import get_llm_factory
+from app.models import (
+    Equipment, Intervention, Technician, FailureMode,
+    EquipmentStatus, InterventionStatus, TechnicianStatus
+)
 
 logger = logging.getLogger(__name__)
 
+_LIMIT_RE = re.compile(r"\blimit\b", re.IGNORECASE)
+
 class SQLGeneratorService:
     """
     Generates and executes READ-ONLY SQL queries based on natural language.
@@ -27,6 +39,20 @@ class SQLGeneratorService:
         "technician_assignments"
     ]
     
+    # Write/DDL keywords as whole words, so columns like updated_at pass.
+    # Server functions that are unsafe even inside a SELECT (remote
+    # execution, file access, sleeps, settings) match as prefixes, which
+    # also covers variants such as dblink_exec or pg_read_file.
+    # Matched against the lower-cased query: re.IGNORECASE made each search
+    # about twice as slow as one str.lower() plus a case-sensitive search.
+    _FORBIDDEN_RE = re.compile(
+        r"\b(?:insert|update|delete|drop|alter|truncate|grant|exec)\b"
+        r"|dblink|pg_read|pg_ls_dir|pg_sleep|lo_import|lo_export|pg_terminate|set_config"
+    )
+    _ALLOWED_TABLE_RE = re.compile(
+        r"\b(?:" + "|".join(ALLOWED_TABLES) + r")\b"
+    )
+    
     SCHEMA_DESCRIPTION = """
     Target Database Schema (PostgreSQL):
     
@@ -44,9 +70,96 @@ class SQLGeneratorService:
     
     5. failure_modes (id, equipment_id, mode_name, description, severity, rpn_value)
     """
+    
+    # Built once: every request sends the same system message first, so
+    # providers with prompt prefix caching can reuse it across calls
+    SYSTEM_PROMPT = f"""
+        You are an expert SQL generator for a PostgreSQL database.
+        
+        {SCHEMA_DESCRIPTION}
+        
+        Rules:
+        1. Generate valid PostgreSQL SELECT statements ONLY.
+        2. Use only the tables listed above.
+        3. Do NOT use JOINs unless absolutely necessary.
+        4. If the user asks for "how many", use COUNT(*).
+        5. Return ONLY the raw SQL query, no markdown, no explanations.
+        6. Do not end with a semicolon.
+        """
 
+    # Fixed-shape questions answered without the LLM. Only whole questions
+    # match, so anything with extra qualifiers still goes to _generate_sql.
+    _COUNT_EN_RE = re.compile(r"^how many (?P<phrase>[^?]+?)(?: are there| do we have)?\s*\??$")
+    _COUNT_FR_RE = re.compile(
+        r"^combien (?:de |d')(?P<phrase>[^?]+?)(?: y a-t-il| avons-nous)?\s*\??$"
+    )
+    _GROUP_EN_RE = re.compile(
+        r"^(?:number of |count of )?(?P<table>[^?]+?) (?:count )?by (?P<column>[^?\s]+)\s*\??$"
+    )
+    _GROUP_FR_RE = re.compile(r"^nombre (?:de |d')(?P<table>[^?]+?) par (?P<column>[^?\s]+)\s*\??$")
+    
+    _TABLE_ALIASES = {
+        "equipment": "equipment",
+        "equipments": "equipment",
+        "machines": "equipment",
+        "équipements": "equipment",
+        "equipements": "equipment",
+        "interventions": "interventions",
+        "technicians": "technicians",
+        "techniciens": "technicians",
+        "spare parts": "spare_parts",
+        "pièces de rechange": "spare_parts",
+        "failure modes": "failure_modes",
+        "modes de défaillance": "failure_modes",
+    }
+    
+    # Status words per table; SQLEnum stores the member names (e.g. 'OPEN')
+    _STATUS_ALIASES = {
+        "equipment": {
+            "active": EquipmentStatus.ACTIVE, "actifs": EquipmentStatus.ACTIVE,
+            "inactive": EquipmentStatus.INACTIVE, "inactifs": EquipmentStatus.INACTIVE,
+            "in maintenance": EquipmentStatus.MAINTENANCE,
+            "en maintenance": EquipmentStatus.MAINTENANCE,
+            "decommissioned": EquipmentStatus.DECOMMISSIONED,
+            "réformés": EquipmentStatus.DECOMMISSIONED,
+        },
+        "interventions": {
+            "open": InterventionStatus.OPEN, "ouvertes": InterventionStatus.OPEN,
+            "in progress": InterventionStatus.IN_PROGRESS,
+            "en cours": InterventionStatus.IN_PROGRESS,
+            "completed": InterventionStatus.COMPLETED, "terminées": InterventionStatus.COMPLETED,
+            "closed": InterventionStatus.CLOSED, "clôturées": InterventionStatus.CLOSED,
+            "cancelled": InterventionStatus.CANCELLED, "annulées": InterventionStatus.CANCELLED,
+        },
+        "technicians": {
+            "active": TechnicianStatus.ACTIVE, "actifs": TechnicianStatus.ACTIVE,
+            "inactive": TechnicianStatus.INACTIVE, "inactifs": TechnicianStatus.INACTIVE,
+            "on leave": TechnicianStatus.ON_LEAVE, "en congé": TechnicianStatus.ON_LEAVE,
+        },
+    }
+    
+    # Columns a count can be grouped by, per table
+    _GROUP_COLUMNS = {
+        "equipment": {
+            "status": "status", "statut": "status", "type": "type",
+            "location": "location", "emplacement": "location",
+        },
+        "interventions": {
+            "status": "status", "statut": "status", "type": "type_panne",
+        },
+        "technicians": {
+            "status": "status", "statut": "status",
+            "specialty": "specialite", "spécialité": "specialite",
+        },
+    }
+    
+    FETCH_BATCH_SIZE = 200
+    # Generated statements kept prepared per database connection
+    MAX_PREPARED_STATEMENTS = 100
+    
     def __init__(self):
-        self.llm_factory = LLMProviderFactory()
+        # Canonical question -> LLM request in progress for it
+        self._in_flight: Dict[str, "asyncio.Task[str]"] = {}
 
     async def generate_and_execute(self, query: str, db: Session) -> Dict[str, Any]:
         """
@@ -55,8 +168,8 @@ class SQLGeneratorService:
         3. Execute and return results
         """
         try:
-            # 1. Generate SQL
-            sql_query = await self._generate_sql(query)
+            # 1. Generate SQL (common counts come from templates, no LLM call)
+            sql_query = self._match_template(query) or await self._generate_sql(query)
             if not sql_query:
                 return {"error": "Could not generate valid SQL"}
                 
@@ -64,47 +177,107 @@ class SQLGeneratorService:
             if not self._is_safe_query(sql_query):
                 return {"error": "Generated SQL was flagged as unsafe"}
                 
-            # 3. Execute
-            result = db.execute(text(sql_query)).mappings().all()
+            # 3. Bound the result set; repeated queries reuse a prepared plan
+            sql_query = self._apply_limit(sql_query)
+            statement = self._prepared_statement(sql_query, db)
+            
+            # 4. Refuse queries the planner expects to be expensive
+            cost = self._estimate_cost(statement, db)
+            if cost is not None and cost > rag_settings.SQL_MAX_PLAN_COST:
+                logger.warning(f"Generated SQL rejected, plan cost {cost:.0f}: {sql_query}")
+                self._deallocate(statement, db)
+                return {"error": "query too expensive"}
             
-            # Format results
-            data = [dict(row) for row in result]
+            # 5. Execute
+            row_count, columns = self._fetch_columns(statement, db)
             
             return {
                 "generated_sql": sql_query,
-                "row_count": len(data),
-                "data": data,
-                "summary": self._summarize_results(data)
+                "row_count": row_count,
+                "columns": columns,
+                "summary": self._summarize_results(row_count, columns)
             }
             
         except Exception as e:
             logger.error(f"SQL Generation error: {e}")
             return {"error": str(e)}
 
-    async def _generate_sql(self, user_query: str) -> str:
-        """Use LLM to generate SQL"""
-        system_prompt = f"""
-        You are an expert SQL generator for a PostgreSQL database.
+    def _match_template(self, user_query: str) -> Optional[str]:
+        """SQL for a simple count question, None when no template applies"""
+        question = " ".join(user_query.lower().split())
         
-        {self.SCHEMA_DESCRIPTION}
+        for regex, status_first in ((self._COUNT_EN_RE, True), (self._COUNT_FR_RE, False)):
+            match = regex.match(question)
+            if match:
+                return self._count_sql(match["phrase"], status_first)
         
-        Rules:
-        1. Generate valid PostgreSQL SELECT statements ONLY.
-        2. Use only the tables listed above.
-        3. Do NOT use JOINs unless absolutely necessary.
-        4. If the user asks for "how many", use COUNT(*).
-        5. Return ONLY the raw SQL query, no markdown, no explanations.
-        6. Do not end with a semicolon.
+        for regex in (self._GROUP_EN_RE, self._GROUP_FR_RE):
+            match = regex.match(question)
+            if match:
+                table = self._TABLE_ALIASES.get(match["table"])
+                column = self._GROUP_COLUMNS.get(table, {}).get(match["column"])
+                if column:
+                    return (
+                        f"SELECT {column}, COUNT(*) AS count FROM {table} "
+                        f"GROUP BY {column} ORDER BY count DESC"
+                    )
+        
+        return None
+
+    def _count_sql(self, phrase: str, status_first: bool) -> Optional[str]:
+        """
+        COUNT query for "<table>" or a table plus status ("open interventions",
+        "interventions ouvertes"); status_first gives the word order
         """
+        table = self._TABLE_ALIASES.get(phrase)
+        if table:
+            return f"SELECT COUNT(*) AS count FROM {table}"
+        
+        for alias, table in self._TABLE_ALIASES.items():
+            if status_first and phrase.endswith(" " + alias):
+                status = phrase[:-len(alias) - 1]
+            elif not status_first and phrase.startswith(alias + " "):
+                status = phrase[len(alias) + 1:]
+            else:
+                continue
+            
+            member = self._STATUS_ALIASES.get(table, {}).get(status)
+            if member is not None:
+                return f"SELECT COUNT(*) AS count FROM {table} WHERE status = '{member.name}'"
+        
+        return None
+
+    async def _generate_sql(self, user_query: str) -> str:
+        """Use LLM to generate SQL (cached per normalized question)"""
+        # Case and whitespace variants of a question share one cache entry
+        canonical_query = " ".join(user_query.lower().split())
+        cached_sql = await cache_service.get_generated_sql(canonical_query)
+        if cached_sql:
+            return cached_sql
         
-        provider = self.llm_factory.get_provider()
-        response = await provider.generate(
-            system_prompt=system_prompt,
-            user_prompt=f"Generate SQL for: {user_query}"
-        )
+        # Concurrent identical questions share one LLM request. The task is
+        # shielded so a cancelled caller does not cancel it for the others.
+        task = self._in_flight.get(canonical_query)
+        if task is None:
+            task = asyncio.ensure_future(self._request_sql(user_query, canonical_query))
+            self._in_flight[canonical_query] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(canonical_query, None))
+        return await asyncio.shield(task)
+
+    async def _request_sql(self, user_query: str, canonical_query: str) -> str:
+        """Ask the LLM for SQL and cache it"""
+        llm_factory = await get_llm_factory()
+        response = await llm_factory.generate(messages=[
+            LLMMessage(role="system", content=self.SYSTEM_PROMPT),
+            LLMMessage(role="user", content=f"Generate SQL for: {user_query}")
+        ])
         
         # Clean response
-        sql = response.strip().replace("```sql", "").replace("```", "").strip()
+        sql = response.content.strip().replace("```sql", "").replace("```", "").strip()
+        
+        # Only keep SQL that would be executed
+        if sql and self._is_safe_query(sql):
+            await cache_service.set_generated_sql(canonical_query, sql)
         return sql
 
     def _is_safe_query(self, sql: str) -> bool:
@@ -116,26 +289,108 @@ class SQLGeneratorService:
             return False
             
         # No prohibited keywords
-        forbidden = ["insert", "update", "delete", "drop", "alter", "truncate", "grant", "exec"]
-        if any(w in sql_lower for w in forbidden):
+        if self._FORBIDDEN_RE.search(sql_lower):
             return False
             
         # Check table allowlist
         # Simple check - just ensure at least one allowed table is mentioned
-        if not any(t in sql_lower for t in self.ALLOWED_TABLES):
+        if not self._ALLOWED_TABLE_RE.search(sql_lower):
             return False
             
         return True
 
-    def _summarize_results(self, data: List[Dict]) -> str:
+    def _estimate_cost(self, sql: str, db: Session) -> Optional[float]:
+        """Planner total cost of the query (PostgreSQL only, None elsewhere)"""
+        if db.get_bind().dialect.name != "postgresql":
+            return None
+        
+        plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return float(plan[0]["Plan"]["Total Cost"])
+
+    def _apply_limit(self, sql: str) -> str:
+        """
+        Cap the query at SQL_MAX_ROWS: append a LIMIT, or wrap a query that
+        has its own (possibly larger) one
+        """
+        sql = sql.rstrip().rstrip(";")
+        # The added SQL always starts on a new line, so a trailing "-- ..."
+        # comment in the generated query cannot comment it out
+        if _LIMIT_RE.search(sql):
+            return f"SELECT * FROM (\n{sql}\n) AS limited LIMIT {rag_settings.SQL_MAX_ROWS}"
+        return f"{sql}\nLIMIT {rag_settings.SQL_MAX_ROWS}"
+
+    def _prepared_statement(self, sql: str, db: Session) -> str:
+        """
+        On PostgreSQL, PREPARE the query once per connection and return the
+        EXECUTE statement that runs it without re-planning. Other dialects
+        get the SQL back unchanged.
+        """
+        connection = db.connection()
+        if connection.dialect.name != "postgresql":
+            return sql
+        
+        name = "gen_sql_" + hashlib.blake2b(sql.encode(), digest_size=8).hexdigest()
+        # Prepared statements live as long as the DBAPI connection, and so
+        # does connection.info (cleared when the connection is replaced)
+        prepared = connection.info.setdefault("prepared_generated_sql", set())
+        if name not in prepared:
+            if len(prepared) >= self.MAX_PREPARED_STATEMENTS:
+                for old_name in prepared:
+                    connection.execute(text(f"DEALLOCATE {old_name}"))
+                prepared.clear()
+            # EXECUTE cannot stream through a server-side cursor, so the
+            # statement carries its own row cap whatever SQL it was given
+            connection.execute(text(
+                f"PREPARE {name} AS SELECT * FROM (\n{sql}\n) AS capped "
+                f"LIMIT {rag_settings.SQL_MAX_ROWS}"
+            ))
+            prepared.add(name)
+        return f"EXECUTE {name}"
+
+    def _deallocate(self, statement: str, db: Session) -> None:
+        """Drop a rejected prepared statement so it does not hold a slot"""
+        if not statement.startswith("EXECUTE "):
+            return
+        name = statement[len("EXECUTE "):]
+        connection = db.connection()
+        connection.execute(text(f"DEALLOCATE {name}"))
+        connection.info.get("prepared_generated_sql", set()).discard(name)
+
+    def _fetch_columns(self, sql: str, db: Session) -> tuple[int, Dict[str, List[Any]]]:
+        """
+        Fetch at most SQL_MAX_ROWS rows, column-major.
+        
+        Returns the row count and one list of values per column, built
+        from the row tuples rather than one dict per row.
+        """
+        query = text(sql)
+        if not sql.startswith("EXECUTE "):
+            # Stream through a server-side cursor. EXECUTE cannot back one,
+            # but prepared statements are capped in the statement itself.
+            query = query.execution_options(yield_per=self.FETCH_BATCH_SIZE)
+        
+        result = db.execute(query)
+        try:
+            names = list(result.keys())
+            rows = result.fetchmany(rag_settings.SQL_MAX_ROWS)
+        finally:
+            result.close()
+        
+        if not rows:
+            return 0, {name: [] for name in names}
+        return len(rows), dict(zip(names, map(list, zip(*rows))))
+
+    def _summarize_results(self, row_count: int, columns: Dict[str, List[Any]]) -> str:
         """Create a tiny summary string for context"""
-        if not data:
+        if not row_count:
             return "No results found."
         
-        if len(data) == 1 and "count" in data[0]:
-            return f"Count: {data[0]['count']}"
+        if row_count == 1 and "count" in columns:
+            return f"Count: {columns['count'][0]}"
             
-        return f"Found {len(data)} records."
+        return f"Found {row_count} records."
 
 # Global instance
 sql_generator = SQLGeneratorService()
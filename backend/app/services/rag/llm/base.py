@@ -7,7 +7,7 @@ import logging
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional, TypedDict
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -22,7 +22,7 @@ class ProviderStatus(Enum):
     INITIALIZING = "initializing"
 
 
-@dataclass
+@dataclass(slots=True)
 class LLMConfig:
     """Configuration for LLM provider"""
     model_name: str
@@ -33,14 +33,13 @@ class LLMConfig:
     retry_delay_seconds: float = 1.0
 
 
-@dataclass
-class LLMMessage:
-    """Chat message format"""
+class LLMMessage(TypedDict):
+    """Chat message format (a plain dict, already in OpenAI/Groq wire format)"""
     role: str  # "system", "user", "assistant"
     content: str
 
 
-@dataclass
+@dataclass(slots=True)
 class LLMResponse:
     """Standardized response from any LLM provider"""
     content: str
@@ -63,7 +62,7 @@ class LLMResponse:
         return 0
 
 
-@dataclass
+@dataclass(slots=True)
 class ProviderHealthInfo:
     """Health information for a provider"""
     status: ProviderStatus
@@ -123,6 +122,22 @@ class BaseLLMProvider(ABC):
         """
         pass
     
+    async def generate_stream(
+        self,
+        messages: List[LLMMessage],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Stream the generated text as it is produced.
+        
+        Providers without native streaming yield the whole completion
+        as a single chunk.
+        """
+        response = await self.generate(messages, temperature, max_tokens, **kwargs)
+        yield response.content
+    
     @abstractmethod
     async def check_health(self) -> ProviderHealthInfo:
         """
@@ -133,6 +148,10 @@ class BaseLLMProvider(ABC):
         """
         pass
     
+    async def aclose(self) -> None:
+        """Release network resources held by the provider (none by default)"""
+        pass
+    
     async def is_available(self) -> bool:
         """Quick check if provider is available"""
         try:
@@ -141,6 +160,10 @@ class BaseLLMProvider(ABC):
         except Exception:
             return False
     
+    def is_rate_limited(self) -> bool:
+        """Whether a known rate-limit window is still open (local check, no request)"""
+        return False
+    
     def get_model_name(self) -> str:
         """Get the current model name"""
         return self.config.model_name
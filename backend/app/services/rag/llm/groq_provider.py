@@ -4,10 +4,11 @@ Implements BaseLLMProvider for Groq cloud API
 """
 
 import logging
+import re
 import time
 import asyncio
-from typing import List, Optional
-from datetime import datetime
+from typing import AsyncIterator, List, Optional
+from datetime import datetime, timedelta
 
 from app.services.rag.llm.base import (
     BaseLLMProvider,
@@ -20,8 +21,12 @@ from app.services.rag.llm.base import (
 
 logger = logging.getLogger(__name__)
 
+# Groq reset headers look like "7.66s", "2m59.56s" or "120ms"
+_DURATION_RE = re.compile(r"(?:(\d+)h)?(?:(\d+)m(?!s))?(?:([\d.]+)s)?(?:([\d.]+)ms)?")
+
 # Try to import groq, gracefully handle if not installed
 try:
+    import httpx
     from groq import AsyncGroq, APIConnectionError, RateLimitError, APIStatusError
     GROQ_AVAILABLE = True
 except ImportError:
@@ -45,12 +50,35 @@ class GroqProvider(BaseLLMProvider):
         self.api_key = api_key
         self._client: Optional["AsyncGroq"] = None
         self._rate_limit_remaining: Optional[int] = None
-        self._rate_limit_reset: Optional[datetime] = None
+        self._rate_limit_reset: Optional[datetime] = None  # reported to callers
+        self._rate_limit_until = 0.0  # time.monotonic() deadline, for the check
     
     @property
     def provider_name(self) -> str:
         return "groq"
     
+    def is_rate_limited(self) -> bool:
+        """Whether the Retry-After window of the last 429 is still open"""
+        return self._rate_limit_until > time.monotonic()
+    
+    def _get_client(self) -> "AsyncGroq":
+        """Return the shared client, creating it (and its connection pool) once"""
+        if self._client is None:
+            self._client = AsyncGroq(
+                api_key=self.api_key,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_keepalive_connections=20, max_connections=40),
+                    timeout=self.config.timeout_seconds
+                )
+            )
+        return self._client
+    
+    async def aclose(self) -> None:
+        """Close the shared client and its connection pool"""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+    
     async def initialize(self) -> bool:
         """Initialize Groq client and verify API key"""
         
@@ -63,10 +91,10 @@ class GroqProvider(BaseLLMProvider):
             return False
         
         try:
-            self._client = AsyncGroq(api_key=self.api_key)
+            client = self._get_client()
             
             # Test with a minimal request
-            test_response = await self._client.chat.completions.create(
+            test_response = await client.chat.completions.create(
                 model=self.config.model_name,
                 messages=[{"role": "user", "content": "Hi"}],
                 max_tokens=5
@@ -98,13 +126,7 @@ class GroqProvider(BaseLLMProvider):
         if not self._initialized or not self._client:
             raise RuntimeError("Groq provider not initialized")
         
-        start_time = time.time()
-        
-        # Convert messages to Groq format
-        groq_messages = [
-            {"role": msg.role, "content": msg.content}
-            for msg in messages
-        ]
+        start_time = time.monotonic()
         
         # Determine parameters
         temp = temperature if temperature is not None else self.config.temperature
@@ -116,13 +138,13 @@ class GroqProvider(BaseLLMProvider):
             try:
                 response = await self._client.chat.completions.create(
                     model=self.config.model_name,
-                    messages=groq_messages,
+                    messages=messages,
                     temperature=temp,
                     max_tokens=tokens,
                     **kwargs
                 )
                 
-                latency_ms = (time.time() - start_time) * 1000
+                latency_ms = (time.monotonic() - start_time) * 1000
                 
                 # Extract usage info
                 usage = response.usage
@@ -153,10 +175,21 @@ class GroqProvider(BaseLLMProvider):
                 )
                 # Update rate limit info
                 self._rate_limit_remaining = 0
+                retry_after = self._retry_after_seconds(e)
+                if retry_after:
+                    self._rate_limit_reset = datetime.now() + timedelta(seconds=retry_after)
+                    self._rate_limit_until = time.monotonic() + retry_after
                 
                 if attempt < self.config.retry_attempts - 1:
-                    # Exponential backoff
-                    wait_time = self.config.retry_delay_seconds * (2 ** attempt)
+                    # Wait what the API asks for, capped at the largest
+                    # exponential backoff; plain backoff without a hint
+                    max_backoff = self.config.retry_delay_seconds * (
+                        2 ** (self.config.retry_attempts - 1)
+                    )
+                    if retry_after:
+                        wait_time = min(retry_after, max_backoff)
+                    else:
+                        wait_time = self.config.retry_delay_seconds * (2 ** attempt)
                     await asyncio.sleep(wait_time)
                     
             except APIConnectionError as e:
@@ -185,6 +218,64 @@ class GroqProvider(BaseLLMProvider):
         self._log_request(messages, error=last_error)
         raise last_error if last_error else RuntimeError("Groq generation failed")
     
+    async def generate_stream(
+        self,
+        messages: List[LLMMessage],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Stream the completion's text deltas as Groq sends them"""
+        
+        if not self._initialized or not self._client:
+            raise RuntimeError("Groq provider not initialized")
+        
+        start_time = time.monotonic()
+        stream = await self._client.chat.completions.create(
+            model=self.config.model_name,
+            messages=messages,
+            temperature=temperature if temperature is not None else self.config.temperature,
+            max_tokens=max_tokens if max_tokens is not None else self.config.max_tokens,
+            stream=True,
+            **kwargs
+        )
+        
+        first_token_ms = None
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first_token_ms is None:
+                    first_token_ms = (time.monotonic() - start_time) * 1000
+                yield delta
+        
+        logger.debug(
+            f"Groq stream completed: first token {first_token_ms} ms, "
+            f"total {(time.monotonic() - start_time) * 1000:.0f} ms"
+        )
+    
+    @staticmethod
+    def _retry_after_seconds(error: Exception) -> float:
+        """Seconds until the rate limit resets, from the error's response headers (0 if unknown)"""
+        response = getattr(error, "response", None)
+        if response is None:
+            return 0.0
+        
+        for header in ("retry-after", "x-ratelimit-reset-requests"):
+            value = response.headers.get(header)
+            if not value:
+                continue
+            try:
+                return max(float(value), 0.0)
+            except ValueError:
+                pass
+            match = _DURATION_RE.fullmatch(value.strip())
+            if match and any(match.groups()):
+                hours, minutes, seconds, millis = (float(g or 0) for g in match.groups())
+                return hours * 3600 + minutes * 60 + seconds + millis / 1000
+        return 0.0
+    
     async def check_health(self) -> ProviderHealthInfo:
         """Check Groq API availability"""
         
@@ -202,20 +293,32 @@ class GroqProvider(BaseLLMProvider):
                 error_message="No API key configured"
             )
         
+        # A recent 429 from generate() is still in effect
+        if self._rate_limit_until > time.monotonic():
+            return ProviderHealthInfo(
+                status=ProviderStatus.RATE_LIMITED,
+                last_check=datetime.now(),
+                rate_limit_remaining=0,
+                rate_limit_reset_at=self._rate_limit_reset
+            )
+        
         try:
-            start_time = time.time()
+            start_time = time.monotonic()
             
-            # Create temporary client if not initialized
-            client = self._client or AsyncGroq(api_key=self.api_key)
+            # Reuse the pooled client, keep-alive connections included
+            client = self._get_client()
             
-            # Minimal health check request
-            response = await client.chat.completions.create(
-                model=self.config.model_name,
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=1
-            )
+            # Listing models proves the key and the service without spending
+            # completion tokens; also confirms the configured model exists
+            models = await client.models.list()
+            if not any(model.id == self.config.model_name for model in models.data):
+                return ProviderHealthInfo(
+                    status=ProviderStatus.ERROR,
+                    last_check=datetime.now(),
+                    error_message=f"Model {self.config.model_name} not available on Groq"
+                )
             
-            latency_ms = (time.time() - start_time) * 1000
+            latency_ms = (time.monotonic() - start_time) * 1000
             
             self._last_health_check = ProviderHealthInfo(
                 status=ProviderStatus.AVAILABLE,
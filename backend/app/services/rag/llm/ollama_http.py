@@ -0,0 +1,30 @@
+"""
+Shared Ollama HTTP Client
+One connection pool for the /api/tags probes of OllamaProvider and LLMService
+"""
+
+from typing import Optional
+
+import httpx
+
+# Kept open between availability and health checks
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=50)
+HTTP_TIMEOUT = httpx.Timeout(5.0, connect=2.0)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_ollama_http() -> httpx.AsyncClient:
+    """Return the shared HTTP client, creating it on first use"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    return _client
+
+
+async def close_ollama_http() -> None:
+    """Close the shared HTTP client, if it was created"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
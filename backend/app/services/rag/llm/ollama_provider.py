@@ -20,9 +20,17 @@ from app.services.rag.llm.base import (
     ProviderHealthInfo,
     ProviderStatus
 )
+from app.services.rag.llm.ollama_http import get_ollama_http
 
 logger = logging.getLogger(__name__)
 
+# Our roles -> LlamaIndex roles; anything else is sent as a user message
+_ROLE_MAP = {
+    "system": MessageRole.SYSTEM,
+    "user": MessageRole.USER,
+    "assistant": MessageRole.ASSISTANT
+}
+
 
 class OllamaProvider(BaseLLMProvider):
     """
@@ -49,12 +57,8 @@ class OllamaProvider(BaseLLMProvider):
         """Initialize Ollama connection and verify model availability"""
         try:
             # Check if Ollama is running
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/api/tags",
-                    timeout=5.0
-                )
-                response.raise_for_status()
+            response = await get_ollama_http().get(f"{self.base_url}/api/tags")
+            response.raise_for_status()
             
             # Initialize LlamaIndex Ollama wrapper
             self._llm = Ollama(
@@ -99,7 +103,7 @@ class OllamaProvider(BaseLLMProvider):
         if not self._initialized or not self._llm:
             raise RuntimeError("Ollama provider not initialized")
         
-        start_time = time.time()
+        start_time = time.monotonic()
         
         try:
             # Convert to LlamaIndex message format
@@ -114,7 +118,7 @@ class OllamaProvider(BaseLLMProvider):
             # Generate response
             response = await self._llm.achat(chat_messages)
             
-            latency_ms = (time.time() - start_time) * 1000
+            latency_ms = (time.monotonic() - start_time) * 1000
             
             # Build response object
             llm_response = LLMResponse(
@@ -122,12 +126,15 @@ class OllamaProvider(BaseLLMProvider):
                 model_name=self.config.model_name,
                 provider_name=self.provider_name,
                 latency_ms=latency_ms,
-                finish_reason="stop",
-                metadata={
-                    "raw_response": str(response.raw) if hasattr(response, 'raw') else None
-                }
+                finish_reason="stop"
             )
             
+            # Stringifying the raw payload is only worth it when debugging
+            if logger.isEnabledFor(logging.DEBUG):
+                llm_response.metadata["raw_response"] = (
+                    str(response.raw) if hasattr(response, 'raw') else None
+                )
+            
             self._log_request(messages, llm_response)
             return llm_response
             
@@ -138,16 +145,12 @@ class OllamaProvider(BaseLLMProvider):
     async def check_health(self) -> ProviderHealthInfo:
         """Check Ollama availability"""
         try:
-            start_time = time.time()
+            start_time = time.monotonic()
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/api/tags",
-                    timeout=5.0
-                )
-                response.raise_for_status()
+            response = await get_ollama_http().get(f"{self.base_url}/api/tags")
+            response.raise_for_status()
             
-            latency_ms = (time.time() - start_time) * 1000
+            latency_ms = (time.monotonic() - start_time) * 1000
             
             # Check if our model is available
             tags_data = response.json()
@@ -189,16 +192,10 @@ class OllamaProvider(BaseLLMProvider):
     
     def _convert_messages(self, messages: List[LLMMessage]) -> List[ChatMessage]:
         """Convert our message format to LlamaIndex format"""
-        role_map = {
-            "system": MessageRole.SYSTEM,
-            "user": MessageRole.USER,
-            "assistant": MessageRole.ASSISTANT
-        }
-        
         return [
             ChatMessage(
-                role=role_map.get(msg.role, MessageRole.USER),
-                content=msg.content
+                role=_ROLE_MAP.get(msg["role"], MessageRole.USER),
+                content=msg["content"]
             )
             for msg in messages
         ]
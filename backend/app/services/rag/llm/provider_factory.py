@@ -3,10 +3,17 @@ LLM Provider Factory
 Manages provider selection and automatic fallback
 """
 
+import asyncio
 import logging
 import os
-from typing import Optional, Dict, Any
-from datetime import datetime, timedelta
+import random
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import AsyncIterator, Optional, Dict, Any
+from datetime import datetime
+
+import httpx
 
 from app.services.rag.llm.base import (
     BaseLLMProvider,
@@ -17,22 +24,123 @@ from app.services.rag.llm.base import (
     ProviderHealthInfo
 )
 from app.services.rag.llm.ollama_provider import OllamaProvider
-from app.services.rag.llm.groq_provider import GroqProvider
+from app.services.rag.llm.groq_provider import GroqProvider, GROQ_AVAILABLE
 
 logger = logging.getLogger(__name__)
 
+# Timeouts and connection failures; 429 and 5xx are checked by status code
+if GROQ_AVAILABLE:
+    from groq import APIConnectionError as GroqConnectionError
+    _TRANSIENT_ERRORS = (
+        httpx.TimeoutException, httpx.NetworkError, TimeoutError, GroqConnectionError
+    )
+else:
+    _TRANSIENT_ERRORS = (httpx.TimeoutException, httpx.NetworkError, TimeoutError)
+
+
+def _is_retriable(error: Exception) -> bool:
+    """Whether another provider may succeed where this error occurred"""
+    if isinstance(error, _TRANSIENT_ERRORS):
+        return True
+    
+    # groq.APIStatusError and ollama.ResponseError carry status_code
+    status = getattr(error, "status_code", None)
+    if status is None and isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+    return status is not None and (status == 429 or status >= 500)
+
+
+class CircuitState(Enum):
+    """Circuit breaker state for one provider"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass(slots=True)
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker.
+    
+    Opens after failure_threshold consecutive failures so the provider is
+    skipped without waiting for its timeout, then lets a single probe
+    through every recovery_seconds until one succeeds.
+    """
+    failure_threshold: int = 5
+    recovery_seconds: float = 15.0
+    state: CircuitState = CircuitState.CLOSED
+    consecutive_failures: int = 0
+    opened_at: float = 0.0  # time.monotonic()
+    
+    def allow_request(self) -> bool:
+        """Whether the provider may be used; an OPEN circuit becomes HALF_OPEN when due"""
+        if self.state == CircuitState.CLOSED:
+            return True
+        
+        now = time.monotonic()
+        if now - self.opened_at < self.recovery_seconds:
+            return False
+        
+        # One caller gets the probe; restarting the clock covers a lost probe
+        self.state = CircuitState.HALF_OPEN
+        self.opened_at = now
+        return True
+    
+    def record_success(self):
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+    
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if (
+            self.state == CircuitState.HALF_OPEN
+            or self.consecutive_failures >= self.failure_threshold
+        ):
+            self.state = CircuitState.OPEN
+            self.opened_at = time.monotonic()
+
+
+@dataclass(slots=True)
+class RetryBudget:
+    """
+    Token bucket bounding fallback retries.
+    
+    Each successful request adds ratio of a token (up to max_tokens) and
+    each retry spends one, so retries stay near ratio x traffic and stop
+    once a degraded backend keeps failing.
+    """
+    ratio: float = 0.1
+    max_tokens: float = 5.0
+    tokens: float = 5.0
+    
+    def record_success(self):
+        # Rounded so that 1/ratio successes add up to exactly one token
+        # (ten float additions of 0.1 fall just short of 1.0)
+        self.tokens = min(self.max_tokens, round(self.tokens + self.ratio, 9))
+    
+    def try_acquire(self) -> bool:
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
 
 class LLMProviderFactory:
     """
     Factory for LLM providers with automatic fallback.
     
     Manages primary (Groq) and fallback (Ollama) providers,
-    automatically switching when primary is unavailable.
+    automatically switching when primary is unavailable. Provider
+    selection follows each provider's circuit breaker; health checks
+    only run to probe a HALF_OPEN circuit and for the health summary.
     """
     
-    # Health check cache duration
+    # Health check cache duration (health summary)
     HEALTH_CACHE_SECONDS = 30
     
+    # Upper bound of the random delay before retrying on the fallback
+    RETRY_BACKOFF_SECONDS = 0.1
+    
     def __init__(
         self,
         groq_api_key: Optional[str] = None,
@@ -68,16 +176,26 @@ class LLMProviderFactory:
         self._groq_provider: Optional[GroqProvider] = None
         self._ollama_provider: Optional[OllamaProvider] = None
         
-        # Health cache
-        self._groq_health_cache: Optional[tuple[datetime, ProviderHealthInfo]] = None
-        self._ollama_health_cache: Optional[tuple[datetime, ProviderHealthInfo]] = None
+        # Circuit breakers, by provider name
+        self._breakers: Dict[str, CircuitBreaker] = {
+            "groq": CircuitBreaker(),
+            "ollama": CircuitBreaker()
+        }
+        self._retry_budget = RetryBudget()
+        
+        # Health cache: (time.monotonic() of the check, result)
+        self._groq_health_cache: Optional[tuple[float, ProviderHealthInfo]] = None
+        self._ollama_health_cache: Optional[tuple[float, ProviderHealthInfo]] = None
         
         # Statistics
         self._stats = {
             "groq_requests": 0,
             "ollama_requests": 0,
             "fallback_count": 0,
-            "total_failures": 0
+            "total_failures": 0,
+            "retriable_errors": 0,
+            "non_retriable_errors": 0,
+            "retry_budget_exhausted": 0
         }
         
         self._initialized = False
@@ -85,29 +203,47 @@ class LLMProviderFactory:
     async def initialize(self) -> bool:
         """Initialize all configured providers"""
         
-        success = False
+        # Both start-ups are network round trips, run them side by side
+        groq_ok, ollama_ok = await asyncio.gather(
+            self._initialize_groq(),
+            self._initialize_ollama()
+        )
+        success = groq_ok or ollama_ok
         
-        # Initialize Groq if API key available
-        if self._groq_api_key:
-            try:
-                self._groq_provider = GroqProvider(
-                    config=self._groq_config,
-                    api_key=self._groq_api_key
-                )
-                groq_ok = await self._groq_provider.initialize()
-                if groq_ok:
-                    logger.info("Groq provider initialized successfully")
-                    success = True
-                else:
-                    logger.warning("Groq provider failed to initialize")
-                    self._groq_provider = None
-            except Exception as e:
-                logger.error(f"Error initializing Groq provider: {e}")
-                self._groq_provider = None
-        else:
+        self._initialized = success
+        
+        if not success:
+            logger.error("No LLM providers available!")
+        
+        return success
+    
+    async def _initialize_groq(self) -> bool:
+        """Initialize Groq if an API key is available"""
+        if not self._groq_api_key:
             logger.info("No Groq API key configured, skipping Groq provider")
+            return False
+        
+        try:
+            self._groq_provider = GroqProvider(
+                config=self._groq_config,
+                api_key=self._groq_api_key
+            )
+            groq_ok = await self._groq_provider.initialize()
+            if groq_ok:
+                logger.info("Groq provider initialized successfully")
+                return True
+            logger.warning("Groq provider failed to initialize")
+        except Exception as e:
+            logger.error(f"Error initializing Groq provider: {e}")
         
-        # Initialize Ollama
+        # Close the client the failed provider may already have opened
+        if self._groq_provider is not None:
+            await self._groq_provider.aclose()
+        self._groq_provider = None
+        return False
+    
+    async def _initialize_ollama(self) -> bool:
+        """Initialize Ollama"""
         try:
             self._ollama_provider = OllamaProvider(
                 config=self._ollama_config,
@@ -116,20 +252,16 @@ class LLMProviderFactory:
             ollama_ok = await self._ollama_provider.initialize()
             if ollama_ok:
                 logger.info("Ollama provider initialized successfully")
-                success = True
-            else:
-                logger.warning("Ollama provider failed to initialize")
-                self._ollama_provider = None
+                return True
+            logger.warning("Ollama provider failed to initialize")
         except Exception as e:
             logger.error(f"Error initializing Ollama provider: {e}")
-            self._ollama_provider = None
-        
-        self._initialized = success
         
-        if not success:
-            logger.error("No LLM providers available!")
-        
-        return success
+        # Close the client the failed provider may already have opened
+        if self._ollama_provider is not None:
+            await self._ollama_provider.aclose()
+        self._ollama_provider = None
+        return False
     
     async def get_provider(self) -> BaseLLMProvider:
         """
@@ -141,6 +273,11 @@ class LLMProviderFactory:
         Raises:
             RuntimeError if no provider is available
         """
+        provider, _ = await self._select_provider()
+        return provider
+    
+    async def _select_provider(self) -> tuple[BaseLLMProvider, Optional[str]]:
+        """Pick the first usable provider, with the reason the primary was skipped"""
         
         if not self._initialized:
             raise RuntimeError("LLM Factory not initialized")
@@ -148,39 +285,61 @@ class LLMProviderFactory:
         # Determine provider order based on configuration
         if self.primary_provider_name == "groq":
             providers = [
-                ("groq", self._groq_provider, self._check_groq_health),
-                ("ollama", self._ollama_provider, self._check_ollama_health)
+                ("groq", self._groq_provider),
+                ("ollama", self._ollama_provider)
             ]
         else:
             providers = [
-                ("ollama", self._ollama_provider, self._check_ollama_health),
-                ("groq", self._groq_provider, self._check_groq_health)
+                ("ollama", self._ollama_provider),
+                ("groq", self._groq_provider)
             ]
         
         # Try providers in order
-        for name, provider, health_check in providers:
+        fallback_reason = None
+        for name, provider in providers:
             if provider is None:
                 continue
             
-            health = await health_check()
-            
-            if health.status == ProviderStatus.AVAILABLE:
+            if await self._acquire(name, provider):
                 if name != self.primary_provider_name:
                     self._stats["fallback_count"] += 1
-                    logger.info(f"Using fallback provider: {name}")
-                return provider
+                    logger.info(f"Using fallback provider: {name} ({fallback_reason})")
+                return provider, fallback_reason
             
-            elif health.status == ProviderStatus.RATE_LIMITED:
-                logger.warning(f"{name} is rate limited, trying fallback")
-                continue
-            
-            else:
-                logger.warning(f"{name} unavailable: {health.error_message}")
+            if fallback_reason is None:
+                fallback_reason = (
+                    f"{name} rate limited" if provider.is_rate_limited()
+                    else f"{name} circuit {self._breakers[name].state.value}"
+                )
         
         # No provider available
         self._stats["total_failures"] += 1
         raise RuntimeError("No LLM provider available")
     
+    async def _acquire(self, name: str, provider: BaseLLMProvider) -> bool:
+        """Whether the provider may take a request, probing it if its circuit is HALF_OPEN"""
+        # A 429 told us when to come back: skip until then, without spending
+        # a HALF_OPEN probe or waiting through the provider's own retries
+        if provider.is_rate_limited():
+            return False
+        
+        breaker = self._breakers[name]
+        if not breaker.allow_request():
+            return False
+        
+        if breaker.state == CircuitState.HALF_OPEN:
+            health = await provider.check_health()
+            if health.status != ProviderStatus.AVAILABLE:
+                breaker.record_failure()
+                logger.warning(
+                    f"{name} probe failed: {health.error_message or health.status.value}"
+                )
+                return False
+            breaker.record_success()
+            logger.info(f"{name} recovered, circuit closed")
+        
+        return True
+    
     async def generate(
         self,
         messages: list[LLMMessage],
@@ -219,12 +378,15 @@ class LLMProviderFactory:
         # Use automatic selection with fallback
         last_error = None
         
-        provider = await self.get_provider()
+        provider, fallback_reason = await self._select_provider()
+        breaker = self._breakers[provider.provider_name]
         
         try:
             response = await provider.generate(
                 messages, temperature, max_tokens, **kwargs
             )
+            breaker.record_success()
+            self._retry_budget.record_success()
             
             # Update stats
             if provider.provider_name == "groq":
@@ -232,30 +394,95 @@ class LLMProviderFactory:
             else:
                 self._stats["ollama_requests"] += 1
             
+            if fallback_reason:
+                response.metadata["fallback_reason"] = fallback_reason
             return response
             
         except Exception as e:
             last_error = e
+            
+            # Client errors (bad request, auth, ...) would fail again elsewhere
+            if not _is_retriable(e):
+                self._stats["non_retriable_errors"] += 1
+                self._stats["total_failures"] += 1
+                logger.error(f"Provider {provider.provider_name} failed, not retrying: {e}")
+                raise
+            
+            breaker.record_failure()
+            self._stats["retriable_errors"] += 1
             logger.error(f"Provider {provider.provider_name} failed: {e}")
             
-            # Try fallback if enabled
+            # Try fallback if enabled and the retry budget allows it
+            fallback = None
             if self.enable_fallback:
                 fallback = await self._get_fallback_provider(provider.provider_name)
-                if fallback:
-                    logger.info(f"Retrying with fallback provider: {fallback.provider_name}")
-                    self._stats["fallback_count"] += 1
-                    
-                    try:
-                        return await fallback.generate(
-                            messages, temperature, max_tokens, **kwargs
-                        )
-                    except Exception as fallback_error:
-                        logger.error(f"Fallback provider also failed: {fallback_error}")
-                        last_error = fallback_error
+                if fallback and not self._retry_budget.try_acquire():
+                    self._stats["retry_budget_exhausted"] += 1
+                    logger.warning("Retry budget exhausted, not retrying on fallback provider")
+                    fallback = None
+            
+            if fallback:
+                logger.info(f"Retrying with fallback provider: {fallback.provider_name}")
+                self._stats["fallback_count"] += 1
+                fallback_breaker = self._breakers[fallback.provider_name]
+                
+                # Full jitter, so requests failing together don't retry together
+                await asyncio.sleep(random.uniform(0, self.RETRY_BACKOFF_SECONDS))
+                
+                try:
+                    response = await fallback.generate(
+                        messages, temperature, max_tokens, **kwargs
+                    )
+                    fallback_breaker.record_success()
+                    self._retry_budget.record_success()
+                    response.metadata["fallback_reason"] = (
+                        f"{provider.provider_name} failed: {e}"
+                    )
+                    return response
+                except Exception as fallback_error:
+                    if _is_retriable(fallback_error):
+                        fallback_breaker.record_failure()
+                    logger.error(f"Fallback provider also failed: {fallback_error}")
+                    last_error = fallback_error
         
         self._stats["total_failures"] += 1
         raise RuntimeError(f"All providers failed: {last_error}")
     
+    async def generate_stream(
+        self,
+        messages: list[LLMMessage],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response from the best available provider.
+        
+        No fallback once text has been sent: the caller has already
+        received part of the answer.
+        """
+        provider = await self.get_provider()
+        breaker = self._breakers[provider.provider_name]
+        
+        if provider.provider_name == "groq":
+            self._stats["groq_requests"] += 1
+        else:
+            self._stats["ollama_requests"] += 1
+        
+        try:
+            async for delta in provider.generate_stream(
+                messages, temperature, max_tokens, **kwargs
+            ):
+                yield delta
+        except Exception as e:
+            # Same rule as generate(): only failures another attempt could
+            # avoid count against the circuit. Cancellation is not an
+            # Exception and never reaches here.
+            if _is_retriable(e):
+                breaker.record_failure()
+            raise
+        breaker.record_success()
+    
     async def _get_fallback_provider(
         self,
         failed_provider: str
@@ -263,13 +490,11 @@ class LLMProviderFactory:
         """Get fallback provider after primary fails"""
         
         if failed_provider == "groq" and self._ollama_provider:
-            health = await self._check_ollama_health()
-            if health.status == ProviderStatus.AVAILABLE:
+            if await self._acquire("ollama", self._ollama_provider):
                 return self._ollama_provider
         
         elif failed_provider == "ollama" and self._groq_provider:
-            health = await self._check_groq_health()
-            if health.status == ProviderStatus.AVAILABLE:
+            if await self._acquire("groq", self._groq_provider):
                 return self._groq_provider
         
         return None
@@ -286,12 +511,12 @@ class LLMProviderFactory:
         # Check cache
         if self._groq_health_cache:
             cache_time, cached_health = self._groq_health_cache
-            if datetime.now() - cache_time < timedelta(seconds=self.HEALTH_CACHE_SECONDS):
+            if time.monotonic() - cache_time < self.HEALTH_CACHE_SECONDS:
                 return cached_health
         
         # Fresh health check
         health = await self._groq_provider.check_health()
-        self._groq_health_cache = (datetime.now(), health)
+        self._groq_health_cache = (time.monotonic(), health)
         return health
     
     async def _check_ollama_health(self) -> ProviderHealthInfo:
@@ -306,14 +531,20 @@ class LLMProviderFactory:
         # Check cache
         if self._ollama_health_cache:
             cache_time, cached_health = self._ollama_health_cache
-            if datetime.now() - cache_time < timedelta(seconds=self.HEALTH_CACHE_SECONDS):
+            if time.monotonic() - cache_time < self.HEALTH_CACHE_SECONDS:
                 return cached_health
         
         # Fresh health check
         health = await self._ollama_provider.check_health()
-        self._ollama_health_cache = (datetime.now(), health)
+        self._ollama_health_cache = (time.monotonic(), health)
         return health
     
+    async def aclose(self) -> None:
+        """Close the providers' HTTP clients"""
+        for provider in (self._groq_provider, self._ollama_provider):
+            if provider is not None:
+                await provider.aclose()
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get factory statistics"""
         return {
@@ -321,13 +552,31 @@ class LLMProviderFactory:
             "groq_available": self._groq_provider is not None,
             "ollama_available": self._ollama_provider is not None,
             "primary_provider": self.primary_provider_name,
-            "fallback_enabled": self.enable_fallback
+            "fallback_enabled": self.enable_fallback,
+            "circuits": {
+                name: breaker.state.value for name, breaker in self._breakers.items()
+            }
         }
     
     async def get_health_summary(self) -> Dict[str, Any]:
         """Get health summary for all providers"""
-        groq_health = await self._check_groq_health()
-        ollama_health = await self._check_ollama_health()
+        groq_health, ollama_health = await asyncio.gather(
+            self._check_groq_health(),
+            self._check_ollama_health(),
+            return_exceptions=True
+        )
+        if isinstance(groq_health, Exception):
+            groq_health = ProviderHealthInfo(
+                status=ProviderStatus.ERROR,
+                last_check=datetime.now(),
+                error_message=str(groq_health)
+            )
+        if isinstance(ollama_health, Exception):
+            ollama_health = ProviderHealthInfo(
+                status=ProviderStatus.ERROR,
+                last_check=datetime.now(),
+                error_message=str(ollama_health)
+            )
         
         return {
             "groq": {
@@ -368,6 +617,12 @@ async def get_llm_provider() -> BaseLLMProvider:
     return await _llm_factory.get_provider()
 
 
+async def close_llm_factory() -> None:
+    """Close the global factory's HTTP clients, if it was created"""
+    if _llm_factory is not None:
+        await _llm_factory.aclose()
+
+
 async def get_llm_factory() -> LLMProviderFactory:
     """Get the global LLM factory instance"""
     global _llm_factory
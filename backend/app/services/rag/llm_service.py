@@ -5,16 +5,15 @@ Handles text generation for RAG responses
 
 import logging
 from typing import List, Dict, Any, Optional
-import httpx
 
 from llama_index.llms.ollama import Ollama
 from llama_index.core.llms import ChatMessage, MessageRole
 
 from app.services.rag.config import rag_settings
+from app.services.rag.llm.ollama_http import get_ollama_http
 
 logger = logging.getLogger(__name__)
 
-
 class LLMService:
     """LLM service for generating RAG responses"""
     
@@ -28,12 +27,8 @@ class LLMService:
         """Initialize Ollama LLM"""
         try:
             # Check if Ollama is available
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/api/tags",
-                    timeout=5.0
-                )
-                response.raise_for_status()
+            response = await get_ollama_http().get(f"{self.base_url}/api/tags")
+            response.raise_for_status()
             
             # Initialize LLM
             self.llm = Ollama(
@@ -154,12 +149,8 @@ Answer:"""
     async def is_available(self) -> bool:
         """Check if Ollama service is available"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/api/tags",
-                    timeout=5.0
-                )
-                return response.status_code == 200
+            response = await get_ollama_http().get(f"{self.base_url}/api/tags")
+            return response.status_code == 200
         except Exception:
             return False
     
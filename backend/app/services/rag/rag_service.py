@@ -20,6 +20,9 @@ from app.services.rag.document_processor import document_processor
 from app.services.rag.embedding_service import embedding_service
 from app.services.rag.vector_store import vector_store_service
 from app.services.rag.llm_service import llm_service
+from app.services.rag.llm.provider_factory import close_llm_factory
+from app.services.rag.llm.ollama_http import close_ollama_http
+from app.services.rag.hierarchy.section_extractor import close_page_pool
 from app.services.rag.cache_service import cache_service
 
 logger = logging.getLogger(__name__)
@@ -68,6 +71,9 @@ class RAGService:
     async def shutdown(self):
         """Shutdown RAG system"""
         await cache_service.close()
+        await close_llm_factory()
+        await close_ollama_http()
+        close_page_pool()
         vector_store_service.save_index()
         logger.info("RAG system shutdown complete")
     